@@ -0,0 +1,49 @@
+import json
+import sys
+
+'''
+Compares two benchmark result files written by run_benchmarks.py:
+
+    python benchmarks/compare.py old.json new.json
+
+Prints, for every benchmark case present in both files, the CPU time and peak memory ratios (new / old)
+and any change in correctness
+'''
+
+# Result fields that are measurements, every other field identifies the benchmark case
+MEASUREMENTS = {'wall_s', 'cpu_s', 'peak_bytes', 'frames_per_s', 'audio_s_per_cpu_s', 'decoded', 'correct',
+                'bit_errors'}
+
+
+def case_key(result):
+    return tuple(sorted((key, value) for key, value in result.items() if key not in MEASUREMENTS))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print('usage: python benchmarks/compare.py old.json new.json')
+        sys.exit(2)
+
+    with open(argv[0]) as file:
+        old = {case_key(result): result for result in json.load(file)['results']}
+    with open(argv[1]) as file:
+        new = {case_key(result): result for result in json.load(file)['results']}
+
+    for key in sorted(set(old) & set(new), key=str):
+        before, after = old[key], new[key]
+        case = ' '.join('{}={}'.format(name, value) for name, value in key)
+        cpu_ratio = after['cpu_s'] / before['cpu_s'] if before['cpu_s'] > 0 else float('inf')
+        memory_ratio = after['peak_bytes'] / before['peak_bytes'] if before['peak_bytes'] > 0 else float('inf')
+        line = '{:<90} cpu x{:6.2f}  memory x{:6.2f}'.format(case, cpu_ratio, memory_ratio)
+
+        if before.get('correct') != after.get('correct'):
+            line += '  correct: {} -> {}'.format(before.get('correct'), after.get('correct'))
+        if before.get('bit_errors') != after.get('bit_errors'):
+            line += '  bit errors: {} -> {}'.format(before.get('bit_errors'), after.get('bit_errors'))
+
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
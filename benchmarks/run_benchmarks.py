@@ -0,0 +1,379 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+from scipy.io.wavfile import write
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyraisrc import channel, coder_decoder, demodulator, modulator
+from pyraisrc.information_block import InformationBlock
+
+'''
+Reproducible benchmark suite for encode, decode, synthesis and demodulation.
+All inputs are generated with the modulator (fixed seeds), results are written as JSON:
+
+    python benchmarks/run_benchmarks.py -o results.json [--quick]
+    python benchmarks/compare.py old.json new.json
+'''
+
+FULL = {
+    'batch_sizes': [1, 100, 10000, 100000],
+    'sampling_rates': [8000, 16000, 44100, 48000, 96000, 192000],
+    'noise_levels': [0.0, 0.1, 0.3, 1.0],
+    'durations': [10, 60, 600, 3600],
+    'engines': ['fft', 'goertzel'],
+    'working_rates': [None, 8000],
+    'fft_backends': ['numpy', 'scipy'],
+    'start_search_signals': 100,
+    'repeat': 3,
+}
+
+QUICK = {
+    'batch_sizes': [1, 1000],
+    'sampling_rates': [8000, 44100, 192000],
+    'noise_levels': [0.0, 0.3],
+    'durations': [10, 60],
+    'engines': ['fft', 'goertzel'],
+    'working_rates': [None, 8000],
+    'fft_backends': ['numpy', 'scipy'],
+    'start_search_signals': 20,
+    'repeat': 1,
+}
+
+START = datetime.datetime(2020, 1, 1)
+
+
+'''
+Returns the best wall time and CPU time over repeat runs of fn, and the peak memory (bytes traced by tracemalloc)
+of an extra run, together with the value returned by the last run
+'''
+def measure(fn, repeat):
+    wall, cpu = [], []
+    for _ in range(repeat):
+        wall_0, cpu_0 = time.perf_counter(), time.process_time()
+        value = fn()
+        wall.append(time.perf_counter() - wall_0)
+        cpu.append(time.process_time() - cpu_0)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'wall_s': min(wall), 'cpu_s': min(cpu), 'peak_bytes': peak}, value
+
+
+'''
+Returns N consecutive minutes starting at START as InformationBlocks
+'''
+def make_blocks(N):
+    return [InformationBlock.from_datetime(START + datetime.timedelta(minutes=i), 'CET') for i in range(N)]
+
+
+'''
+Returns the binary string of two frames
+'''
+def to_sequence(frame1, frame2):
+    return ''.join('1' if bit else '0' for bit in frame1) + ' ' + ''.join('1' if bit else '0' for bit in frame2)
+
+
+def bench_encode(batch_size, repeat):
+    blocks = make_blocks(batch_size)
+    datetimes = np.arange(np.datetime64(START, 'm'), np.datetime64(START, 'm') + batch_size)
+
+    single, _ = measure(lambda: [coder_decoder.encode(block) for block in blocks], repeat)
+    batch, _ = measure(lambda: coder_decoder.encode_batch(datetimes, 'CET'), repeat)
+
+    return [
+        dict(single, benchmark='encode', path='single', batch_size=batch_size, frames_per_s=batch_size / single['cpu_s']),
+        dict(batch, benchmark='encode', path='batch', batch_size=batch_size, frames_per_s=batch_size / batch['cpu_s']),
+    ]
+
+
+def bench_decode(batch_size, repeat):
+    datetimes = np.arange(np.datetime64(START, 'm'), np.datetime64(START, 'm') + batch_size)
+    frame1, frame2 = coder_decoder.encode_batch(datetimes, 'CET')
+    sequences = [to_sequence(f1, f2) for f1, f2 in zip(frame1, frame2)]
+
+    single, _ = measure(lambda: [coder_decoder.decode(sequence) for sequence in sequences], repeat)
+    batch, _ = measure(lambda: coder_decoder.decode_batch(sequences), repeat)
+
+    packed = [coder_decoder.string_to_packed_frames(sequence) for sequence in sequences]
+    packed_frame1 = np.array([f1 for f1, _ in packed], dtype=np.uint32)
+    packed_frame2 = np.array([f2 for _, f2 in packed], dtype=np.uint16)
+    packed_single, _ = measure(lambda: [coder_decoder.decode_packed(f1, f2) for f1, f2 in packed], repeat)
+    packed_batch, _ = measure(lambda: coder_decoder.decode_packed_batch(packed_frame1, packed_frame2), repeat)
+
+    # Corrupt frames (one flipped bit each): raising decode against the status codes of try_decode
+    corrupt = [sequence[:20] + ('1' if sequence[20] == '0' else '0') + sequence[21:] for sequence in sequences]
+    corrupt_single, _ = measure(lambda: [decode_or_none(sequence) for sequence in corrupt], repeat)
+    corrupt_try, _ = measure(lambda: [coder_decoder.try_decode(sequence) for sequence in corrupt], repeat)
+
+    return [
+        dict(single, benchmark='decode', path='single', batch_size=batch_size, frames_per_s=batch_size / single['cpu_s']),
+        dict(batch, benchmark='decode', path='batch', batch_size=batch_size, frames_per_s=batch_size / batch['cpu_s']),
+        dict(packed_single, benchmark='decode', path='packed_single', batch_size=batch_size,
+             frames_per_s=batch_size / packed_single['cpu_s']),
+        dict(packed_batch, benchmark='decode', path='packed_batch', batch_size=batch_size,
+             frames_per_s=batch_size / packed_batch['cpu_s']),
+        dict(corrupt_single, benchmark='decode', path='corrupt_single', batch_size=batch_size,
+             frames_per_s=batch_size / corrupt_single['cpu_s']),
+        dict(corrupt_try, benchmark='decode', path='corrupt_try', batch_size=batch_size,
+             frames_per_s=batch_size / corrupt_try['cpu_s']),
+    ]
+
+
+def decode_or_none(sequence):
+    try:
+        return coder_decoder.decode(sequence, verbose=False)
+    except Exception:
+        return None
+
+
+def bench_synthesis(sampling_rate, repeat):
+    frame1, frame2 = coder_decoder.encode(make_blocks(1)[0])
+    metrics, waveform = measure(lambda: modulator.generate_waveform(frame1, frame2, sampling_rate), repeat)
+    audio_s = waveform.size / sampling_rate
+
+    return [dict(metrics, benchmark='synthesis', sampling_rate=sampling_rate,
+                 audio_s_per_cpu_s=audio_s / metrics['cpu_s'])]
+
+
+'''
+Returns the benchmark case fields of the demodulation options that differ from their defaults, so that
+cases with default options stay comparable with results of runs that did not have these options
+'''
+def options_case(working_rate=None, fft_backend='numpy'):
+    case = {}
+    if working_rate is not None:
+        case['working_rate'] = working_rate
+    if fft_backend != 'numpy':
+        case['fft_backend'] = fft_backend
+    return case
+
+
+'''
+Demodulation of a single signal held in memory: 1.5 s of leading noise, the signal, 0.5 s of trailing noise.
+Accuracy is reported as the number of wrong bits (all 48 when no sequence is found)
+'''
+def bench_demodulation(sampling_rate, noise_level, engine, start_search, working_rate, fft_backend, repeat):
+    block = make_blocks(1)[0]
+    frame1, frame2 = coder_decoder.encode(block)
+    expected = to_sequence(frame1, frame2)
+
+    rng = np.random.default_rng(0)
+    waveform = modulator.generate_waveform(frame1, frame2, sampling_rate, amplitude=0.5)
+    lead, trail = int(1.5 * sampling_rate), int(0.5 * sampling_rate)
+    data = rng.standard_normal(lead + waveform.size + trail).astype(np.float32) * np.float32(noise_level)
+    data[lead:lead + waveform.size] += waveform
+
+    def run():
+        try:
+            return demodulator.locate_sequence_in_data(data, sampling_freq=sampling_rate, engine=engine,
+                                                       start_search=start_search, verbose=False,
+                                                       working_rate=working_rate, fft_backend=fft_backend)[1]
+        except Exception:
+            return None
+
+    metrics, sequence = measure(run, repeat)
+    audio_s = data.size / sampling_rate
+
+    bit_errors = 48 if sequence is None else sum(bit != expected_bit for bit, expected_bit in zip(sequence, expected))
+
+    return [dict(metrics, benchmark='demodulation', sampling_rate=sampling_rate, noise_level=noise_level,
+                 engine=engine, start_search=start_search, **options_case(working_rate, fft_backend),
+                 audio_s_per_cpu_s=audio_s / metrics['cpu_s'], correct=sequence == expected, bit_errors=bit_errors)]
+
+
+'''
+Streaming demodulation of a recording of the given duration with one signal per minute, the first one at 1 s
+'''
+def bench_streaming(duration, sampling_rate, engine, working_rate, directory, repeat):
+    starts = list(range(1, duration - 8, 60))
+    blocks = make_blocks(len(starts))
+    file_path = os.path.join(directory, 'timeline_{}_{}.wav'.format(duration, sampling_rate))
+
+    if not os.path.exists(file_path):
+        modulator.write_timeline(zip(starts, blocks), file_path, duration, sampling_rate, amplitude=0.5,
+                                 noise_level=0.05, sample_format='int16', seed=0)
+
+    metrics, found = measure(lambda: list(demodulator.iter_sequences_from_file(
+        file_path, engine=engine, start_search='matched', sync_beeps=True, working_rate=working_rate)), repeat)
+
+    expected = {str(block) for block in blocks}
+    correct = sum(str(info_block) in expected for _, _, info_block in found)
+
+    return [dict(metrics, benchmark='streaming', duration_s=duration, sampling_rate=sampling_rate, engine=engine,
+                 **options_case(working_rate), audio_s_per_cpu_s=duration / metrics['cpu_s'], signals=len(starts), decoded=len(found),
+                 correct=correct)]
+
+
+'''
+Start of signal search accuracy of the streaming demodulator: a recording of random frames (seeded), each one
+after 0.5 to 20 s of faint noise. A signal is correct when its sequence is found at its exact start of signal,
+so any search landing on another alignment of the frame IDs shows up as correct < signals
+'''
+def bench_start_search(signals, sampling_rate, start_search, sync_beeps, directory, repeat):
+    file_path = os.path.join(directory, 'random_frames_{}_{}.wav'.format(signals, sampling_rate))
+    rng = np.random.default_rng(0)
+    frame1, frame2 = channel.random_frames(signals, rng)
+    leads = np.round(rng.uniform(0.5, 20.0, signals) * sampling_rate).astype(np.int64)
+
+    parts, expected = [], {}
+    offset = 0
+    for lead, f1, f2 in zip(leads, frame1, frame2):
+        parts.append(np.zeros(lead, dtype=np.float32))
+        parts.append(modulator.cached_waveform(f1, f2, sampling_rate).astype(np.float32))
+        expected[offset + int(lead)] = to_sequence(f1, f2)
+        offset += int(lead) + parts[-1].size
+
+    if not os.path.exists(file_path):
+        data = np.concatenate(parts + [np.zeros(sampling_rate, dtype=np.float32)])
+        data += rng.standard_normal(data.size).astype(np.float32) * np.float32(0.01)
+        write(file_path, sampling_rate, data)
+
+    metrics, found = measure(lambda: list(demodulator.iter_sequences_from_file(
+        file_path, start_search=start_search, sync_beeps=sync_beeps)), repeat)
+
+    correct = sum(expected.get(start) == sequence for start, sequence, _ in found)
+    duration = (offset + sampling_rate) / sampling_rate
+
+    return [dict(metrics, benchmark='start_search', sampling_rate=sampling_rate, start_search=start_search,
+                 sync_beeps=sync_beeps, audio_s_per_cpu_s=duration / metrics['cpu_s'], signals=signals,
+                 decoded=len(found), correct=correct)]
+
+
+'''
+Returns the accuracy and speed of every decimated case against the same case at the native sampling rate:
+bit errors and correctness (demodulation) or correctly decoded signals (streaming) of both, and the CPU speedup
+'''
+def decimation_report(results):
+    native = {}
+    for result in results:
+        if result['benchmark'] in ('demodulation', 'streaming') and 'working_rate' not in result:
+            native[case_key(result)] = result
+
+    report = []
+    for result in results:
+        if 'working_rate' not in result:
+            continue
+        reference = native.get(case_key(result))
+        if reference is None:
+            continue
+
+        entry = {key: value for key, value in result.items() if key in ('benchmark', 'sampling_rate', 'noise_level',
+                                                                         'engine', 'start_search', 'duration_s',
+                                                                         'working_rate', 'fft_backend')}
+        entry['speedup'] = reference['cpu_s'] / result['cpu_s'] if result['cpu_s'] > 0 else float('inf')
+        for measurement in ('bit_errors', 'correct'):
+            if measurement in reference:
+                entry['native_' + measurement] = reference[measurement]
+                entry[measurement] = result[measurement]
+        report.append(entry)
+
+    return report
+
+
+'''
+Returns the fields identifying a demodulation or streaming case, other than its working rate
+'''
+def case_key(result):
+    return tuple(sorted((key, value) for key, value in result.items()
+                        if key in ('benchmark', 'sampling_rate', 'noise_level', 'engine', 'start_search', 'duration_s',
+                                   'fft_backend')))
+
+
+'''
+Returns the environment of the run (versions, platform, commit)
+'''
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='pyRAIsrc benchmark suite')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='JSON output file')
+    parser.add_argument('--quick', action='store_true', help='reduced parameter grid')
+    parser.add_argument('--only', nargs='*', default=None,
+                        help='run only these benchmarks (encode, decode, synthesis, demodulation, streaming, '
+                             'start_search)')
+    args = parser.parse_args(argv)
+
+    grid = QUICK if args.quick else FULL
+    repeat = grid['repeat']
+    selected = set(args.only) if args.only else {'encode', 'decode', 'synthesis', 'demodulation', 'streaming',
+                                                 'start_search'}
+    results = []
+
+    def run(name, fn, *params):
+        if name not in selected:
+            return
+        for result in fn(*params):
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr)
+
+    for batch_size in grid['batch_sizes']:
+        run('encode', bench_encode, batch_size, repeat)
+        run('decode', bench_decode, batch_size, repeat)
+
+    for sampling_rate in grid['sampling_rates']:
+        run('synthesis', bench_synthesis, sampling_rate, repeat)
+
+        for noise_level in grid['noise_levels']:
+            for engine in grid['engines']:
+                for start_search in ('window', 'matched'):
+                    for working_rate in grid['working_rates']:
+                        if working_rate is not None and working_rate >= sampling_rate:
+                            continue
+                        # The FFT backend only matters to the 'fft' engine
+                        for fft_backend in grid['fft_backends'] if engine == 'fft' else ['numpy']:
+                            run('demodulation', bench_demodulation, sampling_rate, noise_level, engine, start_search,
+                                working_rate, fft_backend, repeat)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for duration in grid['durations']:
+            for engine in grid['engines']:
+                for working_rate in grid['working_rates']:
+                    run('streaming', bench_streaming, duration, 44100, engine, working_rate, directory, repeat)
+
+        for sampling_rate in (8000, 44100):
+            for start_search, sync_beeps in (('window', False), ('matched', False), ('matched', True)):
+                run('start_search', bench_start_search, grid['start_search_signals'], sampling_rate, start_search,
+                    sync_beeps, directory, repeat)
+
+    decimation = decimation_report(results)
+    for entry in decimation:
+        print(json.dumps(entry), file=sys.stderr)
+
+    with open(args.output, 'w') as file:
+        json.dump({'environment': environment(), 'quick': args.quick, 'results': results, 'decimation': decimation},
+                  file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
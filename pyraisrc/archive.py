@@ -0,0 +1,229 @@
+import datetime
+import os
+import struct
+from pyraisrc import coder_decoder
+import numpy as np
+
+'''
+Binary archive of decoded frames: a 16-byte header followed by fixed-size little-endian records.
+Header: magic, format version, record size, 4 reserved bytes.
+Records: the two frames packed as integers (see coder_decoder.string_to_packed_frames), a status code
+(coder_decoder.STATUS_ codes), the capture time (milliseconds since 1970-01-01 00:00 UTC) and the sample offset
+of the signal in its source
+'''
+MAGIC = b'PYRAISRC'
+VERSION = 1
+HEADER = struct.Struct('<8sHH4x')
+
+RECORD_DTYPE = np.dtype([
+    ('frame1', '<u4'),
+    ('frame2', '<u2'),
+    ('status', 'u1'),
+    ('reserved', 'u1'),
+    ('timestamp', '<i8'),
+    ('offset', '<i8'),
+])
+
+# Sorted time index sidecar: (timestamp, record number) pairs sorted by timestamp
+INDEX_DTYPE = np.dtype([('timestamp', '<i8'), ('record', '<i8')])
+INDEX_SUFFIX = '.idx.npy'
+
+
+'''
+Returns capture times as int64 milliseconds since the UTC epoch: datetime objects (naive ones are taken as UTC),
+datetime64 values or numbers of milliseconds, single values or sequences
+'''
+def to_milliseconds(times):
+    if isinstance(times, datetime.datetime):
+        times = [times]
+        single = True
+    else:
+        single = np.ndim(times) == 0
+        times = np.atleast_1d(times)
+
+    if len(times) > 0 and isinstance(times[0], datetime.datetime):
+        times = np.array([time.astimezone(datetime.timezone.utc).replace(tzinfo=None) if time.tzinfo else time
+                          for time in times], dtype='datetime64[ms]')
+
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        times = times.astype('datetime64[ms]').astype(np.int64)
+    else:
+        times = times.astype(np.int64)
+
+    return times[0] if single else times
+
+
+'''
+Append-only writer of an archive file, created with its header if it does not exist.
+Records are written at the end of the file only, so readers can keep reading while the archive grows
+'''
+class ArchiveWriter:
+
+    '''Opens (or creates) the archive'''
+    def __init__(self, path):
+        self.path = path
+
+        # A record cut short by an interrupted append is dropped, so that new records stay aligned
+        if os.path.exists(path) and os.path.getsize(path) > HEADER.size:
+            partial = (os.path.getsize(path) - HEADER.size) % _read_header(path)
+            if partial:
+                os.truncate(path, os.path.getsize(path) - partial)
+
+        self.file = open(path, 'ab')
+
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize))
+            self.file.flush()
+        else:
+            _read_header(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    '''
+    Appends one record per frame pair: frame1 and frame2 as packed integers (single values or arrays),
+    capture times as accepted by to_milliseconds, source offsets in samples.
+    Without a status, it is the status of coder_decoder.try_decode_packed_batch (IDs, parity bits and field ranges)
+    '''
+    def append(self, frame1, frame2, timestamp, offset=0, status=None):
+        frame1 = np.atleast_1d(np.asarray(frame1, dtype=np.uint32))
+        records = np.zeros(frame1.size, dtype=RECORD_DTYPE)
+        records['frame1'] = frame1
+        records['frame2'] = frame2
+        records['timestamp'] = to_milliseconds(timestamp)
+        records['offset'] = offset
+
+        if status is None:
+            _, status = coder_decoder.try_decode_packed_batch(records['frame1'], records['frame2'])
+        records['status'] = status
+
+        self.file.write(records.tobytes())
+        return records.size
+
+    '''
+    Appends one record per binary string as returned by the demodulator, see append
+    '''
+    def append_sequences(self, sequences, timestamps, offsets=0, status=None):
+        bits, well_formed = coder_decoder.strings_to_frame_array(sequences)
+        if not np.all(well_formed):
+            raise Exception('Invalid String: {} malformed sequences'.format(np.count_nonzero(~well_formed)))
+
+        packed = coder_decoder.pack_frame_array(bits)
+        return self.append(packed >> np.uint64(16), packed & np.uint64(0xFFFF), timestamps, offsets, status)
+
+    '''Writes the buffered records to the file'''
+    def flush(self):
+        self.file.flush()
+
+    '''Closes the archive'''
+    def close(self):
+        self.file.close()
+
+
+'''
+Memory-mapped reader of an archive file. Only complete records are mapped, a record being appended is ignored.
+Time range lookups use the sorted index sidecar written by build_index; records appended after the index was built
+are searched linearly, so the index only needs to be rebuilt from time to time
+'''
+class ArchiveReader:
+
+    '''Maps the archive and its index, if any'''
+    def __init__(self, path):
+        self.path = path
+        record_size = _read_header(path)
+
+        count = (os.path.getsize(path) - HEADER.size) // record_size
+        if count > 0:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+        index_path = path + INDEX_SUFFIX
+        self.index = np.load(index_path, mmap_mode='r') if os.path.exists(index_path) else np.zeros(0, INDEX_DTYPE)
+
+        # An index longer than the archive belongs to another file
+        if self.index.size > count:
+            self.index = np.zeros(0, INDEX_DTYPE)
+
+    def __len__(self):
+        return self.records.size
+
+    def __getitem__(self, item):
+        return self.records[item]
+
+    '''
+    Returns the record numbers with a capture time in [start, stop) (as accepted by to_milliseconds, None for
+    no bound), sorted by capture time
+    '''
+    def time_range_indices(self, start=None, stop=None):
+        start = np.iinfo(np.int64).min if start is None else to_milliseconds(start)
+        stop = np.iinfo(np.int64).max if stop is None else to_milliseconds(stop)
+
+        # Indexed records: binary search
+        timestamps = self.index['timestamp']
+        first, last = np.searchsorted(timestamps, [start, stop], side='left')
+        indexed = np.asarray(self.index['record'][first:last])
+
+        # Records appended after the index was built: linear scan
+        tail = self.records['timestamp'][self.index.size:]
+        matches = np.flatnonzero((tail >= start) & (tail < stop)) + self.index.size
+        if matches.size == 0:
+            return indexed
+
+        found = np.concatenate([indexed, matches])
+        return found[np.argsort(self.records['timestamp'][found], kind='stable')]
+
+    '''
+    Returns the records with a capture time in [start, stop), sorted by capture time (see time_range_indices)
+    '''
+    def time_range(self, start=None, stop=None):
+        return self.records[self.time_range_indices(start, stop)]
+
+    '''
+    Returns the decoded records (all of them, or the given ones) as a structured array of BLOCK_DTYPE
+    '''
+    def blocks(self, records=None):
+        records = self.records if records is None else records
+        return coder_decoder.decode_packed_batch(records['frame1'], records['frame2'])
+
+
+'''
+Writes the sorted time index sidecar of an archive (path + INDEX_SUFFIX) covering all of its current records,
+and returns the number of indexed records
+'''
+def build_index(path):
+    records = ArchiveReader(path).records
+    index = np.zeros(records.size, dtype=INDEX_DTYPE)
+
+    order = np.argsort(records['timestamp'], kind='stable')
+    index['timestamp'] = records['timestamp'][order]
+    index['record'] = order
+
+    # Written next to the sidecar first, so that readers never map a partial index
+    temporary_path = path + '.tmp' + INDEX_SUFFIX
+    np.save(temporary_path, index)
+    os.replace(temporary_path, path + INDEX_SUFFIX)
+    return index.size
+
+
+'''
+Returns the record size of an archive after checking its header
+'''
+def _read_header(path):
+    with open(path, 'rb') as file:
+        header = file.read(HEADER.size)
+
+    if len(header) < HEADER.size:
+        raise Exception('Invalid archive: header is missing')
+
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise Exception('Invalid archive: wrong magic number')
+    if version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise Exception('Unsupported archive version {} (record size {})'.format(version, record_size))
+
+    return record_size
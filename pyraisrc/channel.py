@@ -0,0 +1,169 @@
+import concurrent.futures
+import os
+from scipy.signal import hilbert
+from pyraisrc.signal_utils import *
+from pyraisrc import coder_decoder, demodulator, detector, modulator
+import numpy as np
+
+# Silence after the end of each simulated signal, in seconds
+trail_duration = 0.5
+
+
+'''
+Returns the waveforms of a batch of signals as a (N, samples) float32 array, given the frames as (N, 32) and (N, 16)
+bool arrays. The bit windows of two cached waveforms from modulator.cached_waveform (all 0 bits and all 1 bits) are
+picked per row, so the batch is built without generating each waveform
+'''
+def batch_waveforms(frame1, frame2, sampling_rate, amplitude=1.0):
+    bits = np.concatenate([np.asarray(frame1, dtype=bool), np.asarray(frame2, dtype=bool)], axis=1)
+    low = modulator.cached_waveform(np.zeros(32), np.zeros(16), sampling_rate, amplitude)
+    high = modulator.cached_waveform(np.ones(32), np.ones(16), sampling_rate, amplitude)
+
+    # Bit carried by each sample (48 outside of the frames, always False)
+    bit_N = int(bit_duration / 1000 * sampling_rate)
+    sample_bit = np.full(low.size, 48)
+    for i, start in enumerate(detector.bit_window_starts(sampling_rate)):
+        sample_bit[start:start + bit_N] = i
+
+    bits = np.concatenate([bits, np.zeros((bits.shape[0], 1), dtype=bool)], axis=1)
+    return np.where(bits[:, sample_bit], high, low)
+
+
+'''
+Returns the batch of waveforms through a simulated channel as a (N, samples) float32 array,
+together with the leading delay (in samples) of each signal. Every parameter is a single value or one value per row:
+- amplitude: scaling of each waveform
+- frequency_offset: shift (Hz) of every tone of the waveform, applied on its analytic signal (Hilbert transform)
+- delay: leading delay in seconds, or a (min, max) range to draw each delay uniformly from
+- snr_db: signal-to-noise ratio of the additive white gaussian noise, relative to the power of a tone
+  (amplitude ** 2 / 2), None for no noise
+Each signal is followed by trail_duration seconds, all rows have the length of the longest delay
+'''
+def simulate(waveforms, sampling_rate, snr_db=None, delay=0.0, amplitude=1.0, frequency_offset=0.0, rng=None):
+    rng = np.random.default_rng(rng)
+    waveforms = np.atleast_2d(np.asarray(waveforms, dtype=np.float32))
+    N, signal_N = waveforms.shape
+
+    amplitude = np.broadcast_to(np.asarray(amplitude, dtype=np.float32), (N,))
+    signals = waveforms * amplitude[:, np.newaxis]
+
+    frequency_offset = np.broadcast_to(np.asarray(frequency_offset, dtype=np.float64), (N,))
+    if np.any(frequency_offset != 0):
+        t = np.arange(signal_N) / sampling_rate
+        shift = np.exp(2j * np.pi * frequency_offset[:, np.newaxis] * t)
+        signals = np.real(hilbert(signals, axis=1) * shift).astype(np.float32)
+
+    if isinstance(delay, tuple):
+        delay = rng.uniform(delay[0], delay[1], N)
+    delays = np.round(np.broadcast_to(np.asarray(delay, dtype=np.float64), (N,)) * sampling_rate).astype(np.int64)
+
+    total_N = int(delays.max()) + signal_N + int(trail_duration * sampling_rate)
+    received = np.zeros((N, total_N), dtype=np.float32)
+
+    # Every row is shifted by its own delay at once
+    columns = delays[:, np.newaxis] + np.arange(signal_N)
+    np.put_along_axis(received, columns, signals, axis=1)
+
+    if snr_db is not None:
+        snr_db = np.broadcast_to(np.asarray(snr_db, dtype=np.float64), (N,))
+        sigma = np.sqrt(amplitude.astype(np.float64) ** 2 / 2 / 10 ** (snr_db / 10))
+        received += (rng.standard_normal((N, total_N)) * sigma[:, np.newaxis]).astype(np.float32)
+
+    return received, delays
+
+
+'''
+Returns N random frames (uniform minutes of the 2000-2099 century, random time zone) as (N, 32) and (N, 16) bool arrays
+'''
+def random_frames(N, rng=None):
+    rng = np.random.default_rng(rng)
+    first, last = np.datetime64('2000-01-01T00:00', 'm'), np.datetime64('2099-12-31T23:59', 'm')
+    minutes = first + rng.integers(0, (last - first).astype(np.int64) + 1, N)
+    return coder_decoder.encode_batch(minutes, rng.integers(0, 2, N).astype(bool))
+
+
+'''
+Runs every engine over a batch of simulated frames and returns, for each engine, a dict with the number of frames,
+bits, bit errors (over the frames with a demodulated sequence), missed frames (no start of signal or sequence found),
+rejected frames (missed, or refused by the decoder because of wrong IDs, parities or fields out of range), and among
+the refused ones the frames recovered by the single-bit soft decision correction (coder_decoder.try_decode_soft),
+with the right bits (corrected) or wrong ones (miscorrected).
+start_search is 'window' or 'matched' (with or without sync_beeps), or None to demodulate at the true delay
+of each signal (bit detector only). The default matched search on the whole signal keeps start of signal errors
+well below the bit errors, so that the counts measure the bit detectors. Channel parameters are the ones of simulate
+'''
+def run_batch(N, sampling_rate, engines=detector.engines, start_search='matched', sync_beeps=True, snr_db=None,
+              delay=(0.5, 1.5), amplitude=1.0, frequency_offset=0.0, seed=None):
+    rng = np.random.default_rng(seed)
+    frame1, frame2 = random_frames(N, rng)
+    received, delays = simulate(batch_waveforms(frame1, frame2, sampling_rate), sampling_rate, snr_db, delay,
+                                amplitude, frequency_offset, rng)
+    expected = np.concatenate([frame1, frame2], axis=1)
+
+    results = {}
+    for engine in engines:
+        counts = {'frames': N, 'bits': 0, 'bit_errors': 0, 'missed': 0, 'rejected': 0, 'corrected': 0,
+                  'miscorrected': 0}
+
+        for row, signal_delay, expected_bits in zip(received, delays, expected):
+            try:
+                if start_search is None:
+                    _, soft_bits = demodulator.locate_soft_bits_in_data(row[signal_delay:], sampling_rate, True,
+                                                                        engine)
+                else:
+                    _, soft_bits = demodulator.locate_soft_bits_in_data(row, sampling_rate, False, engine,
+                                                                        start_search, sync_beeps)
+            except demodulator.NoSyncError:
+                counts['missed'] += 1
+                counts['rejected'] += 1
+                continue
+
+            bits = soft_bits >= 0
+            counts['bits'] += bits.size
+            counts['bit_errors'] += int(np.count_nonzero(bits != expected_bits))
+
+            if coder_decoder.try_decode(detector.bits_to_sequence(bits)).status != coder_decoder.STATUS_OK:
+                counts['rejected'] += 1
+
+                corrected = coder_decoder.try_decode_soft(soft_bits)
+                if corrected.corrected is not None:
+                    right = corrected.sequence == detector.bits_to_sequence(expected_bits)
+                    counts['corrected' if right else 'miscorrected'] += 1
+
+        results[engine] = counts
+
+    return results
+
+
+'''
+Runs N simulated frames in batches of batch_size over a process pool (processes=None for one process per CPU,
+1 to run in the current process) and returns, for each engine, the summed counts of run_batch together with
+'ber' (bit errors / bits), 'rejection_rate' (rejected / frames) and 'soft_rejection_rate' (frames still rejected
+after the soft decision correction / frames).
+Batches are seeded from a single seed, so results only depend on the seed and the batch size
+'''
+def ber_harness(N, sampling_rate, engines=detector.engines, start_search='matched', sync_beeps=True, snr_db=None,
+                delay=(0.5, 1.5), amplitude=1.0, frequency_offset=0.0, seed=0, batch_size=100, processes=None):
+    sizes = [min(batch_size, N - start) for start in range(0, N, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = [(size, sampling_rate, engines, start_search, sync_beeps, snr_db, delay, amplitude, frequency_offset,
+                  batch_seed)
+                 for size, batch_seed in zip(sizes, seeds)]
+
+    if processes == 1:
+        batches = [run_batch(*batch_arguments) for batch_arguments in arguments]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+            batches = list(pool.map(run_batch, *zip(*arguments)))
+
+    results = {}
+    for engine in engines:
+        counts = {key: sum(batch[engine][key] for batch in batches)
+                  for key in ('frames', 'bits', 'bit_errors', 'missed', 'rejected', 'corrected', 'miscorrected')}
+        counts['ber'] = counts['bit_errors'] / counts['bits'] if counts['bits'] > 0 else float('nan')
+        counts['rejection_rate'] = counts['rejected'] / counts['frames'] if counts['frames'] > 0 else float('nan')
+        counts['soft_rejection_rate'] = (counts['rejected'] - counts['corrected'] - counts['miscorrected']) \
+            / counts['frames'] if counts['frames'] > 0 else float('nan')
+        results[engine] = counts
+
+    return results
@@ -0,0 +1,168 @@
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+from scipy.io.wavfile import read
+from pyraisrc import coder_decoder, demodulator, detector
+
+'''
+Command line tool decoding SRC signals from many recordings in parallel, see main
+'''
+
+
+'''
+Returns the sorted list of audio files given files, directories (walked recursively for .wav files) and glob patterns
+'''
+def collect_files(paths):
+    files = set()
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.update(os.path.join(root, name) for name in names if name.lower().endswith('.wav'))
+        elif os.path.exists(path):
+            files.add(path)
+        else:
+            files.update(match for match in glob.glob(path, recursive=True) if os.path.isfile(match))
+
+    return sorted(files)
+
+
+'''
+Returns the set of paths already present in a JSON-lines output file (used to resume a run)
+'''
+def processed_files(output_path):
+    done = set()
+
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path) as file:
+        for line in file:
+            try:
+                done.add(json.loads(line)['path'])
+            except (ValueError, KeyError):
+                # A line cut by an interrupted run
+                continue
+
+    return done
+
+
+'''
+Returns a result dictionary (one JSON line) for a decoded or failed signal, status being one of
+coder_decoder.status_names (None when the file could not be processed at all)
+'''
+def make_result(path, sampling_freq=None, offset=None, sequence=None, info_block=None, error=None, status=None):
+    return {
+        'path': path,
+        'offset': offset,
+        'offset_seconds': offset / sampling_freq if offset is not None else None,
+        'sequence': sequence,
+        'fields': dict(info_block.__dict__) if info_block is not None else None,
+        'status': status,
+        'error': error,
+    }
+
+
+'''
+Returns the result dictionary of a coder_decoder.DecodeResult: the 'error' of a signal that does not decode
+with STATUS_OK is its status name
+'''
+def decode_result(path, sampling_freq, result):
+    status = coder_decoder.status_names[result.status]
+    error = None if result.status == coder_decoder.STATUS_OK else status
+    return make_result(path, sampling_freq, result.offset, result.sequence, result.info_block, error, status)
+
+
+'''
+Decodes a single file and returns its list of results.
+In all_signals mode every signal of the file is reported, otherwise only the first one.
+Never raises: signals that fail decoding are reported with their status, other failures in the 'error' field
+'''
+def process_file(path, options):
+    try:
+        if options['all_signals']:
+            # Only the header is read here, the streaming decoder maps the file itself
+            sampling_freq = read(path, mmap=True)[0]
+            results = [coder_decoder.DecodeResult(coder_decoder.STATUS_OK, info_block, sequence, offset)
+                       for offset, sequence, info_block in demodulator.iter_sequences_from_file(
+                           path, engine=options['engine'], start_search=options['start_search'],
+                           sync_beeps=options['sync_beeps'], working_rate=options['working_rate'],
+                           fft_backend=options['fft_backend'], fft_workers=options['fft_workers'],
+                           prescreen=options['prescreen'])]
+            if not results:
+                results = [coder_decoder.DecodeResult(coder_decoder.STATUS_NO_SYNC, None)]
+        else:
+            sampling_freq, data = read(path, mmap=options['prescreen'])
+            results = [demodulator.try_decode_data(data, sampling_freq, options['perfect_generation'],
+                                                   options['engine'], options['start_search'], options['sync_beeps'],
+                                                   options['working_rate'], options['fft_backend'],
+                                                   options['fft_workers'], options['prescreen'])]
+    except Exception as e:
+        return [make_result(path, error=str(e))]
+
+    return [decode_result(path, sampling_freq, result) for result in results]
+
+
+'''
+Entry point of python -m pyraisrc: decodes files, directories or glob patterns over a process pool
+and streams one JSON line per result as soon as each file is done
+'''
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pyraisrc', description='Decode Rai SRC time signals from audio files')
+    parser.add_argument('paths', nargs='+', help='files, directories or glob patterns')
+    parser.add_argument('-o', '--output', help='JSON-lines output file (default: standard output)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--resume', action='store_true', help='skip files already present in the output file')
+    parser.add_argument('--all', dest='all_signals', action='store_true', help='report every signal of each file')
+    parser.add_argument('--engine', choices=detector.engines, default='fft', help='bit detector engine')
+    parser.add_argument('--start-search', choices=('window', 'matched'), default='window',
+                        help='start of signal search')
+    parser.add_argument('--sync-beeps', action='store_true', help='include the sync beeps in the matched filter')
+    parser.add_argument('--perfect', dest='perfect_generation', action='store_true',
+                        help='signals start at the first sample (ideal generation)')
+    parser.add_argument('--working-rate', type=int, default=None,
+                        help='decimate to this sample rate (Hz, e.g. 8000) before searching and detecting bits')
+    parser.add_argument('--fft-backend', choices=detector.fft_backends, default='numpy',
+                        help='FFT of the fft engine band-pass filters')
+    parser.add_argument('--fft-workers', type=int, default=None,
+                        help='threads of each scipy FFT (-1 for all CPUs), per worker process')
+    parser.add_argument('--prescreen', action='store_true',
+                        help='skip files and regions without the SRC energy pattern before demodulating')
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.output:
+        parser.error('--resume requires --output')
+
+    files = collect_files(args.paths)
+    if args.resume:
+        done = processed_files(args.output)
+        files = [path for path in files if path not in done]
+
+    options = {
+        'all_signals': args.all_signals,
+        'engine': args.engine,
+        'start_search': args.start_search,
+        'sync_beeps': args.sync_beeps,
+        'perfect_generation': args.perfect_generation,
+        'working_rate': args.working_rate,
+        'fft_backend': args.fft_backend,
+        'fft_workers': args.fft_workers,
+        'prescreen': args.prescreen,
+    }
+
+    output = open(args.output, 'a' if args.resume else 'w') if args.output else sys.stdout
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+            futures = [pool.submit(process_file, path, options) for path in files]
+
+            for future in concurrent.futures.as_completed(futures):
+                for result in future.result():
+                    output.write(json.dumps(result) + '\n')
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -1,6 +1,8 @@
+import collections
 import numpy as np
 import pyraisrc.signal_utils as signal_utils
-from pyraisrc.information_block import InformationBlock
+from pyraisrc import instrumentation
+from pyraisrc.information_block import InformationBlock, BLOCK_DTYPE, blocks_from_datetime, century_years
 
 
 '''
@@ -37,11 +39,67 @@ def string_to_binary_frames(string: str):
         elif char == '1':
             frame2[i - 33] = True
         else:
-            raise 'Unrecognized character \'{}\''.format(char)
+            raise Exception('Invalid String: Unrecognized character \'{}\''.format(char))
 
     return frame1, frame2
 
 
+'''
+Returns the frames of a sequence of binary strings as a (N, 48) bool numpy array (frame 1 then frame 2)
+together with a bool mask of the well-formed strings. Rows of malformed strings are left to False
+'''
+def strings_to_frame_array(strings):
+    N = len(strings)
+    well_formed = np.array([len(string) == 32 + 16 + 1 for string in strings], dtype=bool)
+
+    # Malformed strings are replaced by a placeholder of the right size, so that all rows can be parsed at once
+    placeholder = '?' * (32 + 16 + 1)
+    buffer = ''.join(string if ok else placeholder for string, ok in zip(strings, well_formed))
+    chars = np.frombuffer(buffer.encode('ascii', errors='replace'), dtype=np.uint8).reshape(N, 32 + 16 + 1)
+
+    digits = np.delete(chars, 32, axis=1)
+    well_formed &= np.all((digits == ord('0')) | (digits == ord('1')), axis=1)
+    well_formed &= chars[:, 32] == ord(' ')
+
+    bits = (digits == ord('1')) & well_formed[:, np.newaxis]
+    return bits, well_formed
+
+
+'''
+Returns the two frames packed in a 48-bit integer: first bit of frame 1 as the most significant bit,
+last bit of frame 2 as the least significant one
+'''
+def pack_frames(frame1, frame2):
+    bits = np.concatenate([frame1, frame2]).astype(bool)
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+'''
+Returns the two frames (separately) as bool numpy arrays given the 48-bit packed integer
+'''
+def unpack_frames(packed):
+    bits = np.unpackbits(np.frombuffer(packed.to_bytes(6, 'big'), dtype=np.uint8)).astype(bool)
+    return bits[:32], bits[32:]
+
+
+'''
+Returns the frames of a (N, 48) bit array packed in 48-bit integers as a uint64 numpy array
+'''
+def pack_frame_array(bits):
+    packed_bytes = np.packbits(np.asarray(bits, dtype=bool).reshape(-1, 48), axis=1)
+    padded = np.zeros((packed_bytes.shape[0], 8), dtype=np.uint8)
+    padded[:, 2:] = packed_bytes
+    return padded.view('>u8').ravel().astype(np.uint64)
+
+
+'''
+Returns the (N, 48) bool bit array (frame 1 then frame 2) of an array of 48-bit packed integers
+'''
+def unpack_frame_array(packed):
+    packed_bytes = np.asarray(packed, dtype='>u8').reshape(-1, 1).view(np.uint8)
+    return np.unpackbits(packed_bytes[:, 2:], axis=1).astype(bool)
+
+
 # FRAME 1 BITS
 ID_F1 = [0, 1]
 OR = range(2, 8)
@@ -71,60 +129,384 @@ ID_F2_VALUE = np.array([True, False])
 AN_VALUES = np.array([80, 40, 20, 10, 8, 4, 2, 1])
 SE_VALUES = np.array([4, 2, 1])
 
+# DECODE STATUS CODES, in the order the checks are made (the first failing check is reported)
+STATUS_OK = 0
+STATUS_BAD_ID = 1  # wrong frame 1 or frame 2 ID bits
+STATUS_P1 = 2  # wrong P1 parity bit
+STATUS_P2 = 3  # wrong P2 parity bit
+STATUS_PA = 4  # wrong PA parity bit
+STATUS_OUT_OF_RANGE = 5  # a field is out of its range or not a valid BCD code (e.g. hour 25, minutes 0x0F)
+STATUS_MALFORMED = 6  # the binary string is not 32 + 16 binary digits separated by a space
+STATUS_NO_SYNC = 7  # no start of signal found in the audio (see demodulator.try_decode_data)
+
+status_names = ('ok', 'bad_id', 'p1_parity', 'p2_parity', 'pa_parity', 'out_of_range', 'malformed', 'no_sync')
+
+'''
+Result of the non-raising decode functions:
+- status: one of the STATUS_ codes
+- info_block: decoded InformationBlock, None when the frames are malformed or fail the ID or parity checks
+  (fields out of range are still decoded, as decode does)
+- sequence: string of binary digits (None when unknown)
+- offset: first sample of the signal in the audio (None when unknown)
+- corrected: index (0 to 47) of the bit flipped by try_decode_soft to recover the frames, None when no bit was flipped
+'''
+DecodeResult = collections.namedtuple('DecodeResult', ['status', 'info_block', 'sequence', 'offset', 'corrected'],
+                                      defaults=(None, None, None))
+
+'''
+Returns the decoded values of a field for every possible raw value of its bits (first bit as the most significant)
+'''
+def _field_table(bit_values):
+    raw = np.arange(1 << len(bit_values))
+    shifts = np.arange(len(bit_values) - 1, -1, -1)
+    return ((raw[:, np.newaxis] >> shifts) & 1) @ bit_values
+
+
+'''
+Returns, for every possible raw value of the bits of a field, True if it decodes to a value between low and high
+and is the code the encoder gives to that value (so BCD digits above 9 are rejected)
+'''
+def _range_table(bit_values, low, high):
+    values = _field_table(bit_values)
+    shifts = np.arange(len(bit_values) - 1, -1, -1)
+    canonical = signal_utils.coded_integers(np.clip(values, low, high), bit_values) @ (1 << shifts)
+    return (values >= low) & (values <= high) & (canonical == np.arange(values.size))
+
+
+# LOOKUP TABLES, indexed by the raw bits of a field shifted out of the packed frames
+# (frame 1 as a 32-bit integer, frame 2 as a 16-bit integer, first bit as the most significant)
+OR_TABLE = _field_table(OR_VALUES)
+MI_TABLE = _field_table(MI_VALUES)
+ME_TABLE = _field_table(ME_VALUES)
+GM_TABLE = _field_table(GM_VALUES)
+GS_TABLE = _field_table(GS_VALUES)
+AN_TABLE = _field_table(AN_VALUES)
+SE_TABLE = _field_table(SE_VALUES)
+SI_TABLE = np.array([0, -2, 1, -1])  # +1 * first bit - 2 * second bit
+# RANGE TABLES, indexed like the lookup tables: True for the raw bits of a valid field
+OR_RANGE = _range_table(OR_VALUES, 0, 23)
+MI_RANGE = _range_table(MI_VALUES, 0, 59)
+ME_RANGE = _range_table(ME_VALUES, 1, 12)
+GM_RANGE = _range_table(GM_VALUES, 1, 31)
+GS_RANGE = _range_table(GS_VALUES, 1, 7)
+AN_RANGE = _range_table(AN_VALUES, 0, 99)
+SI_RANGE = np.array([True, False, True, True])  # 01 is never sent
+
+PARITY_TABLE = (np.unpackbits(np.arange(1 << 16, dtype='>u2').view(np.uint8).reshape(-1, 2), axis=1)
+                .sum(axis=1) % 2).astype(bool)
+
+# Plain list copies for the scalar path, where indexing a list is cheaper than indexing a numpy array
+_OR_LIST, _MI_LIST, _ME_LIST, _GM_LIST, _GS_LIST, _AN_LIST, _SE_LIST, _SI_LIST = \
+    (table.tolist() for table in (OR_TABLE, MI_TABLE, ME_TABLE, GM_TABLE, GS_TABLE, AN_TABLE, SE_TABLE, SI_TABLE))
+_PARITY_LIST = PARITY_TABLE.tolist()
+_OR_RANGE_LIST, _MI_RANGE_LIST, _ME_RANGE_LIST, _GM_RANGE_LIST, _GS_RANGE_LIST, _AN_RANGE_LIST, _SI_RANGE_LIST = \
+    (table.tolist() for table in (OR_RANGE, MI_RANGE, ME_RANGE, GM_RANGE, GS_RANGE, AN_RANGE, SI_RANGE))
+
+# Exceptions raised by decode for each failed check
+_STATUS_MESSAGES = {
+    STATUS_BAD_ID: 'Invalid Rai SRC: At least one of the frame IDs is wrong',
+    STATUS_P1: 'Invalid Rai SRC: P1 parity bit is incorrect',
+    STATUS_P2: 'Invalid Rai SRC: P2 parity bit is incorrect',
+    STATUS_PA: 'Invalid Rai SRC: PA parity bit is incorrect',
+}
+
+
+'''
+Returns the signal frames (separately) packed in integers: frame 1 on 32 bits and frame 2 on 16 bits,
+first bit of each frame as the most significant one. Raises the same exceptions as string_to_binary_frames
+'''
+def string_to_packed_frames(string: str):
+    if len(string) != (32 + 16 + 1) or string[32] != ' ' or string[:32].strip('01') or string[33:].strip('01'):
+        # Slow path, only used to raise the appropriate exception
+        string_to_binary_frames(string)
+
+    return int(string[:32], 2), int(string[33:], 2)
+
+
 '''
 Returns an InformationBlock object containing all SRC information contained in the input binary string
-raises exceptions in case of inconsistencies (ID bits and parity)
+raises exceptions in case of inconsistencies (ID bits and parity), wrong IDs are also printed in verbose mode
 '''
-def decode(binary_string: str):
-    frame1, frame2 = string_to_binary_frames(binary_string)
+def decode(binary_string: str, verbose=True):
+    with instrumentation.stage('decode'):
+        frame1, frame2 = string_to_packed_frames(binary_string)
+        return _decode_packed(frame1, frame2, verbose)
 
-    # Check ID bits for both frames
-    id1_check = (frame1[ID_F1] != ID_F1_VALUE)
-    id2_check = (frame2[ID_F2] != ID_F2_VALUE)
-    check_all = np.sum(id1_check) + np.sum(id2_check)
-    if check_all > 0:
-        print('Frame 1 ID: {}  | Frame 2 ID: {}'.format(frame1[ID_F1], frame2[ID_F2]))
-        raise Exception('Invalid Rai SRC: At least one of the frame IDs is wrong')
 
-    # Frame 1 decoding
-    hour = np.dot(frame1[OR], OR_VALUES)
-    minutes = np.dot(frame1[MI], MI_VALUES)
+'''
+Same as decode, given the two frames packed in integers as returned by string_to_packed_frames.
+Every field is read with a shift, a mask and a lookup table, so the cost does not depend on the frame contents
+'''
+def decode_packed(frame1: int, frame2: int, verbose=True):
+    with instrumentation.stage('decode'):
+        return _decode_packed(int(frame1), int(frame2), verbose)
 
-    is_cest = frame1[OE]
 
-    parity_1 = np.sum(frame1[0:16]) % 2 == 0  # Odd parity
+'''
+Body of decode and decode_packed, measured as the 'decode' stage
+'''
+def _decode_packed(frame1: int, frame2: int, verbose=True):
+    status = _check_packed(frame1, frame2)
+
+    if status != STATUS_OK:
+        if status == STATUS_BAD_ID and verbose:
+            print('Frame 1 ID: {}  | Frame 2 ID: {}'.format(np.array([frame1 >> 31 & 1, frame1 >> 30 & 1], dtype=bool),
+                                                            np.array([frame2 >> 15 & 1, frame2 >> 14 & 1], dtype=bool)))
+        raise Exception(_STATUS_MESSAGES[status])
 
-    if parity_1 != frame1[P1]:
-        raise Exception('Invalid Rai SRC: P1 parity bit is incorrect')
+    return _block_from_packed(frame1, frame2)
 
-    month = np.dot(frame1[ME], ME_VALUES)
-    day = np.dot(frame1[GM], GM_VALUES)
-    day_of_week = np.dot(frame1[GS], GS_VALUES)
 
-    parity_2 = np.sum(frame1[17:31]) % 2 == 0  # Odd parity
+'''
+Returns a DecodeResult for the input binary string, without raising or printing: malformed strings, wrong IDs,
+wrong parity bits and fields out of range are reported by the status code.
+The InformationBlock is the one decode returns, decode raises on the same frames it is None for
+'''
+def try_decode(binary_string: str):
+    with instrumentation.stage('decode'):
+        if len(binary_string) != (32 + 16 + 1) or binary_string[32] != ' ' or binary_string[:32].strip('01') \
+                or binary_string[33:].strip('01'):
+            return DecodeResult(STATUS_MALFORMED, None, binary_string)
 
-    if parity_2 != frame1[P2]:
-        raise Exception('Invalid Rai SRC: P2 parity bit is incorrect')
+        return _try_decode_packed(int(binary_string[:32], 2), int(binary_string[33:], 2), binary_string)
+
+
+'''
+Same as try_decode, given the two frames packed in integers as returned by string_to_packed_frames
+'''
+def try_decode_packed(frame1: int, frame2: int):
+    with instrumentation.stage('decode'):
+        return _try_decode_packed(int(frame1), int(frame2))
 
-    # Frame 2 decoding
-    year = np.dot(frame2[AN], AN_VALUES)
-    time_to_next_time_zone_change = np.dot(frame2[SE], SE_VALUES)  # If more than 7 days, equal to 7
-    leap_second_bits = frame2[SI]
-    warning_leap_second = +1 * leap_second_bits[0] - 2 * leap_second_bits[1]
-    parity = np.sum(frame2[0:15]) % 2 == 0  # Odd parity
 
-    if parity != frame2[PA]:
-        raise Exception('Invalid Rai SRC: PA parity bit is incorrect')
+'''
+Body of try_decode and try_decode_packed, measured as the 'decode' stage
+'''
+def _try_decode_packed(frame1: int, frame2: int, sequence=None):
+    status = _check_packed(frame1, frame2)
+    if status == STATUS_OK and not (_OR_RANGE_LIST[frame1 >> 24 & 0x3F] and _MI_RANGE_LIST[frame1 >> 17 & 0x7F]
+                                    and _ME_RANGE_LIST[frame1 >> 10 & 0x1F] and _GM_RANGE_LIST[frame1 >> 4 & 0x3F]
+                                    and _GS_RANGE_LIST[frame1 >> 1 & 0x7] and _AN_RANGE_LIST[frame2 >> 6 & 0xFF]
+                                    and _SI_RANGE_LIST[frame2 >> 1 & 0x3]):
+        status = STATUS_OUT_OF_RANGE
+
+    if status not in (STATUS_OK, STATUS_OUT_OF_RANGE):
+        return DecodeResult(status, None, sequence)
+
+    return DecodeResult(status, _block_from_packed(frame1, frame2), sequence)
+
+
+'''
+Returns a DecodeResult given the soft decisions of the 48 bits (e.g. demodulator.locate_soft_bits_in_data:
+positive for 1 bits, the larger in magnitude the more reliable). When the hard decisions fail the ID, parity or range
+checks, the least reliable single bit whose flip gives frames passing all of them is flipped, and its index is
+reported in 'corrected'. A single flip only changes one parity group (P1, P2 or PA), so frames failing two groups,
+or passing them with fields out of range, are left as they are. Frames with three or more bit errors can be
+miscorrected into another valid frame: with max_flip_margin, bits with a larger soft decision magnitude are never
+flipped, trading recovered frames for fewer miscorrections. Never raises nor prints
+'''
+def try_decode_soft(soft_bits, max_flip_margin=None):
+    with instrumentation.stage('decode'):
+        soft_bits = np.asarray(soft_bits, dtype=np.float64).ravel()
+        packed = pack_frames(soft_bits[:32] >= 0, soft_bits[32:] >= 0)
+
+        result = _try_decode_packed(packed >> 16, packed & 0xFFFF, _packed_sequence(packed))
+        if result.status == STATUS_OK:
+            return result
+
+        # Least reliable bits first
+        margins = np.abs(soft_bits)
+        for index in np.argsort(margins, kind='stable').tolist():
+            if max_flip_margin is not None and margins[index] > max_flip_margin:
+                break
+
+            flipped = packed ^ 1 << 47 - index
+            if _check_packed(flipped >> 16, flipped & 0xFFFF) != STATUS_OK:
+                continue
+
+            corrected = _try_decode_packed(flipped >> 16, flipped & 0xFFFF, _packed_sequence(flipped))
+            if corrected.status == STATUS_OK:
+                return corrected._replace(corrected=index)
+
+        return result
+
+
+'''
+Returns the string of binary digits of the two frames packed in a 48-bit integer
+'''
+def _packed_sequence(packed: int):
+    return '{:032b} {:016b}'.format(packed >> 16, packed & 0xFFFF)
 
+
+'''
+Returns the status code of the ID and parity checks of the packed frames (STATUS_OK when all of them pass)
+'''
+def _check_packed(frame1: int, frame2: int):
+    # Check ID bits for both frames
+    if frame1 >> 30 != 0b01 or frame2 >> 14 != 0b10:
+        return STATUS_BAD_ID
+
+    # Odd parity: bits 0 to 16 of frame 1 (P1 included), bits 17 to 31 (P2 included) and the whole frame 2
+    if not (_PARITY_LIST[frame1 >> 16] ^ (frame1 >> 15 & 1)):
+        return STATUS_P1
+
+    if not _PARITY_LIST[frame1 & 0x7FFF]:
+        return STATUS_P2
+
+    if not _PARITY_LIST[frame2]:
+        return STATUS_PA
+
+    return STATUS_OK
+
+
+'''
+Returns the InformationBlock of the packed frames, without any check
+'''
+def _block_from_packed(frame1: int, frame2: int):
     info_block = InformationBlock()
-    info_block.set_time(hour, minutes)
-    info_block.set_date(day, month, year, day_of_week)
-    info_block.set_time_zone(is_cest)
-    info_block.set_next_time_zone_change(time_to_next_time_zone_change)
-    info_block.set_leap_second(warning_leap_second)
+    info_block.set_time(_OR_LIST[frame1 >> 24 & 0x3F], _MI_LIST[frame1 >> 17 & 0x7F])
+    info_block.set_date(_GM_LIST[frame1 >> 4 & 0x3F], _ME_LIST[frame1 >> 10 & 0x1F],
+                        _AN_LIST[frame2 >> 6 & 0xFF], _GS_LIST[frame1 >> 1 & 0x7])
+    info_block.set_time_zone(bool(frame1 >> 16 & 1))
+    info_block.set_next_time_zone_change(_SE_LIST[frame2 >> 3 & 0x7])
+    info_block.set_leap_second(_SI_LIST[frame2 >> 1 & 0x3])
     return info_block
 
 
+'''
+Decodes many frames at once: frames is either a (N, 48) bool/uint8 numpy array (frame 1 then frame 2)
+or a sequence of N binary strings.
+Returns a structured numpy array of BLOCK_DTYPE, all fields are computed as column operations and
+the 'valid' field is False for rows with malformed strings, wrong IDs or wrong P1/P2/PA parity
+'''
+def decode_batch(frames):
+    return try_decode_batch(frames)[0]
+
+
+'''
+Same as decode_batch, given two arrays of frames packed in integers: frame 1 on 32 bits and frame 2 on 16 bits.
+Every field is gathered from its lookup table with np.take
+'''
+def decode_packed_batch(frame1, frame2):
+    return try_decode_packed_batch(frame1, frame2)[0]
+
+
+'''
+Same as decode_batch, also returning the status code of every row as a uint8 numpy array
+(see try_decode, fields out of range are only reported by the status code)
+'''
+def try_decode_batch(frames):
+    with instrumentation.stage('decode_batch') as stage:
+        if isinstance(frames, np.ndarray):
+            bits = frames.astype(bool).reshape(-1, 32 + 16)
+            well_formed = np.ones(bits.shape[0], dtype=bool)
+        else:
+            bits, well_formed = strings_to_frame_array(frames)
+
+        packed = np.packbits(bits, axis=1)
+        frame1 = packed[:, :4].copy().view('>u4').ravel()
+        frame2 = packed[:, 4:].copy().view('>u2').ravel()
+
+        blocks, status = _decode_packed_batch(frame1, frame2)
+        blocks['valid'] &= well_formed
+        status[~well_formed] = STATUS_MALFORMED
+        stage.record(blocks=blocks)
+
+    return blocks, status
+
+
+'''
+Same as decode_packed_batch, also returning the status code of every row (see try_decode_batch)
+'''
+def try_decode_packed_batch(frame1, frame2):
+    with instrumentation.stage('decode_batch') as stage:
+        blocks, status = _decode_packed_batch(frame1, frame2)
+        stage.record(blocks=blocks)
+
+    return blocks, status
+
+
+'''
+Batch version of try_decode_soft, given the soft decisions as a (N, 48) array: returns the blocks, the status codes
+and the index of the flipped bit of every row (-1 for rows left as they are) as an int8 numpy array.
+The 48 single-bit flips of all failing rows are checked at once, each row keeping its least reliable valid flip
+'''
+def try_decode_soft_batch(soft_bits, max_flip_margin=None):
+    with instrumentation.stage('decode_batch') as stage:
+        soft_bits = np.asarray(soft_bits, dtype=np.float64).reshape(-1, 32 + 16)
+        packed = pack_frame_array(soft_bits >= 0)
+
+        blocks, status = _decode_packed_batch(packed >> np.uint64(16), packed & np.uint64(0xFFFF))
+        corrected = np.full(packed.size, -1, dtype=np.int8)
+
+        rows = np.flatnonzero(status != STATUS_OK)
+        if rows.size > 0:
+            masks = np.left_shift(np.uint64(1), np.arange(47, -1, -1, dtype=np.uint64))
+            flipped = packed[rows, np.newaxis] ^ masks
+            _, flipped_status = _decode_packed_batch(flipped.ravel() >> np.uint64(16),
+                                                     flipped.ravel() & np.uint64(0xFFFF))
+
+            margins = np.abs(soft_bits[rows])
+            valid = flipped_status.reshape(flipped.shape) == STATUS_OK
+            if max_flip_margin is not None:
+                valid &= margins <= max_flip_margin
+
+            best = np.argmin(np.where(valid, margins, np.inf), axis=1)
+            fixable = valid.any(axis=1)
+
+            fixed = flipped[fixable, best[fixable]]
+            blocks[rows[fixable]], status[rows[fixable]] = _decode_packed_batch(fixed >> np.uint64(16),
+                                                                                fixed & np.uint64(0xFFFF))
+            corrected[rows[fixable]] = best[fixable]
+
+        stage.record(blocks=blocks)
+
+    return blocks, status, corrected
+
+
+'''
+Body of the batch decoders, measured as the 'decode_batch' stage: returns the blocks and the status codes
+'''
+def _decode_packed_batch(frame1, frame2):
+    frame1 = np.asarray(frame1, dtype=np.uint32).ravel()
+    frame2 = np.asarray(frame2, dtype=np.uint16).ravel()
+
+    blocks = np.zeros(frame1.shape[0], dtype=BLOCK_DTYPE)
+
+    # Frame 1 decoding
+    blocks['hour'] = np.take(OR_TABLE, frame1 >> 24 & 0x3F)
+    blocks['minutes'] = np.take(MI_TABLE, frame1 >> 17 & 0x7F)
+    blocks['is_cest'] = frame1 >> 16 & 1
+    blocks['month'] = np.take(ME_TABLE, frame1 >> 10 & 0x1F)
+    blocks['day'] = np.take(GM_TABLE, frame1 >> 4 & 0x3F)
+    blocks['day_of_week'] = np.take(GS_TABLE, frame1 >> 1 & 0x7)
+
+    # Frame 2 decoding, with the same century choice as InformationBlock.set_date
+    year = np.take(AN_TABLE, frame2 >> 6 & 0xFF)
+    blocks['year'] = century_years(year)
+
+    time_to_next_time_zone_change = np.take(SE_TABLE, frame2 >> 3 & 0x7)
+    blocks['next_tz_change'] = np.where(time_to_next_time_zone_change < 7, time_to_next_time_zone_change, -1)
+    blocks['leap_second'] = np.take(SI_TABLE, frame2 >> 1 & 0x3)
+
+    # Checks in reverse order, so that the first failing one is the status left in each row
+    status = np.full(frame1.shape[0], STATUS_OK, dtype=np.uint8)
+    in_range = np.take(OR_RANGE, frame1 >> 24 & 0x3F) & np.take(MI_RANGE, frame1 >> 17 & 0x7F)
+    in_range &= np.take(ME_RANGE, frame1 >> 10 & 0x1F) & np.take(GM_RANGE, frame1 >> 4 & 0x3F)
+    in_range &= np.take(GS_RANGE, frame1 >> 1 & 0x7) & np.take(AN_RANGE, frame2 >> 6 & 0xFF)
+    in_range &= np.take(SI_RANGE, frame2 >> 1 & 0x3)
+    status[~in_range] = STATUS_OUT_OF_RANGE
+
+    # Odd parities, then ID bits for both frames
+    status[~np.take(PARITY_TABLE, frame2)] = STATUS_PA
+    status[~np.take(PARITY_TABLE, frame1 & 0x7FFF)] = STATUS_P2
+    status[~(np.take(PARITY_TABLE, frame1 >> 16) ^ (frame1 >> 15 & 1).astype(bool))] = STATUS_P1
+    status[~((frame1 >> 30 == 0b01) & (frame2 >> 14 == 0b10))] = STATUS_BAD_ID
+
+    blocks['valid'] = (status == STATUS_OK) | (status == STATUS_OUT_OF_RANGE)
+    return blocks, status
+
+
 '''
 Returns the two frames (separately) as bool numpy arrays given the input InformationBlock
 '''
@@ -175,3 +557,55 @@ def encode(info_block : InformationBlock):
     return frame1, frame2
 
 
+'''
+Encodes many InformationBlocks at once, given as a structured numpy array of BLOCK_DTYPE
+(the 'valid' field is ignored). Returns the frames as (N, 32) and (N, 16) bool numpy arrays,
+bit-identical to calling encode on each block
+'''
+def encode_blocks(blocks):
+    N = blocks.size
+    frame1 = np.zeros((N, 32), dtype=bool)
+    frame2 = np.zeros((N, 16), dtype=bool)
+
+    # Frame 1
+    frame1[:, 1] = True
+    frame1[:, OR] = signal_utils.coded_integers(blocks['hour'], OR_VALUES)
+    frame1[:, MI] = signal_utils.coded_integers(blocks['minutes'], MI_VALUES)
+    frame1[:, OE] = blocks['is_cest']
+    frame1[:, P1] = np.count_nonzero(frame1[:, 0:16], axis=1) % 2 == 0  # Odd parity
+    frame1[:, ME] = signal_utils.coded_integers(blocks['month'], ME_VALUES)
+    frame1[:, GM] = signal_utils.coded_integers(blocks['day'], GM_VALUES)
+    frame1[:, GS] = signal_utils.coded_integers(blocks['day_of_week'], GS_VALUES)
+    frame1[:, P2] = np.count_nonzero(frame1[:, 17:31], axis=1) % 2 == 0  # Odd parity
+
+    # Frame 2
+    frame2[:, 0] = True
+
+    # SRC year bits only have two digits (ambiguity)
+    year = blocks['year'].astype(np.int64)
+    frame2[:, AN] = signal_utils.coded_integers(np.where(year > 2000, year - 2000, year - 1900), AN_VALUES)
+
+    # internal representation of tz_change >= 7 in the InformationBlock is -1
+    tz_change = blocks['next_tz_change'].astype(np.int64)
+    frame2[:, SE] = signal_utils.coded_integers(np.where(tz_change < 0, 7, tz_change), SE_VALUES)
+
+    # Leap second encoding
+    leap_second = blocks['leap_second']
+    frame2[:, SI[0]] = leap_second != 0
+    frame2[:, SI[1]] = leap_second < 0
+
+    frame2[:, PA] = np.count_nonzero(frame2[:, 0:15], axis=1) % 2 == 0  # Odd parity
+
+    return frame1, frame2
+
+
+'''
+Encodes many datetimes at once, as InformationBlock.from_datetime followed by encode would:
+datetimes is a sequence of datetime objects or a datetime64 array (wall clock time of the time zone),
+time_zone, next_tz_change and leap_second are either single values or one value per datetime
+(time_zone as 'CET'/'CEST' strings or as the OE bit).
+Returns the frames as (N, 32) and (N, 16) bool numpy arrays
+'''
+def encode_batch(datetimes, time_zone, next_tz_change=-1, leap_second=0):
+    blocks = blocks_from_datetime(datetimes, time_zone, next_tz_change, leap_second)
+    return encode_blocks(blocks)
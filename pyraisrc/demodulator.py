@@ -1,8 +1,49 @@
+import collections
+from fractions import Fraction
 from scipy.io.wavfile import read
-from numpy.fft import fft, ifft, fftfreq
+from scipy.signal import resample_poly
+from numpy.fft import fft, fftfreq
 from pyraisrc.signal_utils import *
+from pyraisrc import coder_decoder, detector, instrumentation, prescreen, sync
 import numpy as np
-import matplotlib.pyplot as plt
+
+# Covariance floor for the start of signal search
+minimum_start_cov = 7e-4
+
+# Lowest working rate of the decimation front-end: the 2.5 kHz band-pass filter must stay below Nyquist
+minimum_working_rate = 2 * (high_freq + 100)
+
+# Channel combination modes of locate_sequences_in_channels
+combine_modes = ('best', 'sum')
+
+'''
+Result of locate_sequences_in_channels: start of signal (sample offset), binary string and confidence of each channel
+(-1, None and 0.0 for channels without a signal), then binary string and confidence of the combined channels
+(None and 0.0 without combination or without any signal)
+'''
+ChannelSequences = collections.namedtuple('ChannelSequences',
+                                          ['offsets', 'sequences', 'confidences', 'sequence', 'confidence'])
+
+
+'''
+Raised when no start of signal is found, or when the signal is too short to contain both frames
+'''
+class NoSyncError(Exception):
+    pass
+
+
+'''
+Raises on an unknown detector engine, FFT backend or start of signal search, see get_sequence_from_file.
+Checked once by the public functions, before any demodulation
+'''
+def _check_options(engine, fft_backend, start_search):
+    if engine not in detector.engines:
+        raise Exception('Unknown detector engine \'{}\''.format(engine))
+    if fft_backend not in detector.fft_backends:
+        raise Exception('Unknown FFT backend \'{}\''.format(fft_backend))
+    if start_search not in ('window', 'matched'):
+        raise Exception('Unknown start of signal search \'{}\''.format(start_search))
+
 
 '''
 Prints basic file information: sample rate and encoding type
@@ -15,144 +56,754 @@ def print_file_info(file_path):
 '''
 Returns string of binary digits from SRC in file.
 If the file was generated with no noise or delay, perferct_generation should be set to True
+- engine selects the bit detector: 'fft' (full-signal band-pass filters) or 'goertzel' (tone power per bit window)
+- start_search selects the start of signal search: 'window' (covariance over 60 ms windows, first window above threshold)
+  or 'matched' (best matched filter alignment to the sample, optionally including the sync beeps)
+- working_rate (Hz, e.g. 8000) decimates the signal with an anti-aliasing polyphase filter before the start of
+  signal search and the bit detection, all windows and filter bands are computed at the working rate
+- fft_backend selects the FFT of the 'fft' engine (see detector.band_pass): 'numpy' (complex FFT of the signal as is)
+  or 'scipy' (real FFT padded to a fast length, single precision for 16-bit and float32 files, fft_workers threads)
+- prescreen memory-maps the file and only demodulates the candidate regions of the energy pre-screen
+  (see prescreen.py), so a file without SRC is rejected after a single cheap pass
 '''
-def get_sequence_from_file(file_path, perfect_generation=False):
-    sampling_freq, data = read(file_path)
+def get_sequence_from_file(file_path, perfect_generation=False, engine='fft', start_search='window', sync_beeps=False,
+                           working_rate=None, fft_backend='numpy', fft_workers=None, prescreen=False):
+    with instrumentation.stage('read') as stage:
+        sampling_freq, data = read(file_path, mmap=prescreen)
+        stage.record(data=data)
 
-    sampling_period = 1 / sampling_freq
+    if prescreen and not perfect_generation:
+        _, sequence = locate_sequence_in_regions(data, sampling_freq, engine, start_search, sync_beeps, working_rate,
+                                                 fft_backend, fft_workers)
+        return sequence
 
-    # Number of samples for a single bit (30 ms)
-    bit_N = int(bit_duration / 1000 * sampling_freq)
-    bit_samples = np.arange(0, bit_N * sampling_period, sampling_period).astype(np.float32)
-    search_step_samples = int(5 / 1000 * sampling_freq)
+    return get_sequence_from_data(data, sampling_freq, perfect_generation, engine, start_search, sync_beeps,
+                                  working_rate, fft_backend, fft_workers)
+
+
+'''
+Returns string of binary digits from SRC in an already loaded signal.
+If the signal was generated with no noise or delay, perferct_generation should be set to True
+'''
+def get_sequence_from_data(data, sampling_freq, perfect_generation=False, engine='fft', start_search='window',
+                           sync_beeps=False, working_rate=None, fft_backend='numpy', fft_workers=None):
+    _, sequence = locate_sequence_in_data(data, sampling_freq, perfect_generation, engine, start_search, sync_beeps,
+                                          working_rate=working_rate, fft_backend=fft_backend, fft_workers=fft_workers)
+    return sequence
+
+
+'''
+Returns the start of signal (sample offset) and the string of binary digits from SRC in an already loaded signal,
+with the same options as get_sequence_from_data. The start of signal is only printed in verbose mode and
+is always a sample offset of the input signal, even when processing at a working rate.
+Multi-channel data (N, C) is demodulated in a single pass and the channel with the highest confidence is returned
+(see locate_sequences_in_channels)
+'''
+def locate_sequence_in_data(data, sampling_freq, perfect_generation=False, engine='fft', start_search='window',
+                            sync_beeps=False, verbose=True, working_rate=None, fft_backend='numpy', fft_workers=None):
+    _check_options(engine, fft_backend, start_search)
+
+    if np.ndim(data) == 2:
+        result = locate_sequences_in_channels(data, sampling_freq, perfect_generation, engine, start_search,
+                                              sync_beeps, 'best', working_rate, fft_backend, fft_workers)
+        if result.sequence is None:
+            raise NoSyncError('Could not find start of signal!')
+
+        signal_start_index = int(result.offsets[int(np.argmax(result.confidences))])
+        if verbose:
+            print('Signal starts at {} seconds'.format(signal_start_index / sampling_freq))
+
+        return signal_start_index, result.sequence
+
+    signal_start_index, energies = _locate_energies(data, sampling_freq, perfect_generation, engine, start_search,
+                                                    sync_beeps, verbose, working_rate, fft_backend, fft_workers)
+    return signal_start_index, detector.bits_to_sequence(energies[0] <= energies[1])
+
+
+'''
+Returns the start of signal (sample offset) and the soft decisions of the 48 bits of an already loaded (mono) signal,
+with the same options as get_sequence_from_data: the log ratios of the energies of the two tones in each bit window
+(see detector.log_energy_ratios), positive for 1 bits. The hard decisions are the bits of locate_sequence_in_data
+(ratios of exactly 0 are 1 bits), the magnitudes tell the least reliable bits apart, see coder_decoder.try_decode_soft
+'''
+def locate_soft_bits_in_data(data, sampling_freq, perfect_generation=False, engine='fft', start_search='window',
+                             sync_beeps=False, working_rate=None, fft_backend='numpy', fft_workers=None):
+    _check_options(engine, fft_backend, start_search)
+    if np.ndim(data) == 2:
+        raise Exception('Soft decisions of multi-channel data are not supported')
+
+    signal_start_index, energies = _locate_energies(data, sampling_freq, perfect_generation, engine, start_search,
+                                                    sync_beeps, False, working_rate, fft_backend, fft_workers)
+    return signal_start_index, detector.log_energy_ratios(*energies)
+
+
+'''
+Body of locate_sequence_in_data and locate_soft_bits_in_data for mono signals: returns the start of signal and
+the energies of the two tones in the 48 bit windows
+'''
+def _locate_energies(data, sampling_freq, perfect_generation, engine, start_search, sync_beeps, verbose, working_rate,
+                     fft_backend, fft_workers):
+    up, down = _resampling_factors(sampling_freq, working_rate)
+    if (up, down) != (1, 1):
+        input_sampling_freq = sampling_freq
+        data, sampling_freq = decimate(data, sampling_freq, working_rate)
+        signal_start_index, energies = _locate_energies(data, sampling_freq, perfect_generation, engine, start_search,
+                                                        sync_beeps, False, None, fft_backend, fft_workers)
+        signal_start_index = int(round(signal_start_index * down / up))
+
+        if verbose:
+            print('Signal starts at {} seconds'.format(signal_start_index / input_sampling_freq))
 
-    sequence_buffer = ''
+        return signal_start_index, energies
 
     # Start of signal has to be searched if the source sound file isn't perfect
     signal_start_index = -1
 
     if not perfect_generation:
 
-        period = 1.0 / sampling_freq
+        with instrumentation.stage('start_search') as stage:
+            stage.record(data=data)
 
-        # 30 ms long cos waves are precalculated and applied when needed
-        bit_N = int(bit_duration / 1000 * sampling_freq)
-        low_30ms = np.cos(2.0 * np.pi * low_freq * bit_samples)
-        high_30ms = np.cos(2.0 * np.pi * high_freq * bit_samples)
-        target = np.concatenate([low_30ms, high_30ms])
+            if start_search == 'matched':
+                signal_start_index, _ = sync.find_signal_start(data, sampling_freq, sync_beeps)
+            elif start_search == 'window':
+                target = _start_search_target(sampling_freq)
+                covariances = _window_covariances(data, target)
 
-        window_N = target.size
-        window_count = data.size // window_N
-        first_cov = 0.0
-        minimum_cov = 7e-4
+                if covariances.size > 0:
+                    threshold = max(50.0 * covariances[0], minimum_start_cov)
+                    candidates = np.flatnonzero(covariances > threshold)
 
-        for w in range(window_count):
-            w_beg = w * window_N
-            w_end = w_beg + window_N
-            cov = np.cov(data[w_beg:w_end], target)[0, 1]
-            if w == 0:
-                first_cov = cov
+                    if candidates.size > 0:
+                        signal_start_index = int(candidates[0]) * target.size + int(10 / 1000 * sampling_freq)
 
-            if cov > max(50.0 * first_cov, minimum_cov):
-                signal_start_index = w_beg + int(10 / 1000 * sampling_freq)
-                break
-
-        print('Signal starts at {} seconds'.format(signal_start_index / sampling_freq))
+        if verbose:
+            print('Signal starts at {} seconds'.format(signal_start_index / sampling_freq))
 
         if signal_start_index < 0:
-            raise Exception('Could not find start of signal!')
+            raise NoSyncError('Could not find start of signal!')
     else:
         signal_start_index = 0
 
-    # After the start of the signal has been evaluated, filter with band-pass filters
-    signal = data[signal_start_index:]
-    freq_signal = fftfreq(signal.size, sampling_period)
-    sig_fft = fft(signal)
-
-    filter_2k = freq_filter(low_freq, freq_signal, interval=100)
-    filter_2_5k = freq_filter(high_freq, freq_signal, interval=100)
-
-    data_2k = np.real(ifft(filter_2k * sig_fft))
-    data_2_5k = np.real(ifft(filter_2_5k * sig_fft))
-
-    # First frame
-    num_windows = 32
-    for w in range(num_windows):
-        lower_bound = int(w * bit_N)
-        upper_bound = int((w + 1) * bit_N)
-        # The prominent frequency is the one with the highest variance
-        variance_2k = np.var(data_2k[lower_bound:upper_bound])
-        variance_2_5k = np.var(data_2_5k[lower_bound:upper_bound])
-
-        # Append corresponding bit
-        if variance_2k > variance_2_5k:
-            sequence_buffer += '0'
+    energies = _demodulate_energies(data[signal_start_index:], sampling_freq, engine, fft_backend, fft_workers)
+    if energies is None:
+        raise NoSyncError('Signal is too short to contain both frames!')
+
+    return signal_start_index, energies
+
+
+'''
+Returns a coder_decoder.DecodeResult for an already loaded signal, with the same options as locate_sequence_in_data
+(and prescreen as in get_sequence_from_file), without raising or printing: a signal without a start of signal
+(or too short to contain both frames, see NoSyncError) has status STATUS_NO_SYNC, the other failures have the status
+of coder_decoder.try_decode. Invalid options or data still raise
+'''
+def try_decode_data(data, sampling_freq, perfect_generation=False, engine='fft', start_search='window',
+                    sync_beeps=False, working_rate=None, fft_backend='numpy', fft_workers=None, prescreen=False):
+    _check_options(engine, fft_backend, start_search)
+
+    try:
+        if prescreen and not perfect_generation:
+            offset, sequence = locate_sequence_in_regions(data, sampling_freq, engine, start_search, sync_beeps,
+                                                          working_rate, fft_backend, fft_workers)
         else:
-            sequence_buffer += '1'
-
-    sequence_buffer += ' '
-
-    # Second frame
-    num_windows = 16
-    start_frame = 1.0 * sampling_freq
-    for w in range(num_windows):
-        lower_bound = int(start_frame + w * bit_N)
-        upper_bound = int(start_frame + (w + 1) * bit_N)
-        # The prominent frequency is the one with the highest variance
-        variance_2k = np.var(data_2k[lower_bound:upper_bound])
-        variance_2_5k = np.var(data_2_5k[lower_bound:upper_bound])
-
-        # Append corresponding bit
-        if variance_2k > variance_2_5k:
-            sequence_buffer += '0'
+            offset, sequence = locate_sequence_in_data(data, sampling_freq, perfect_generation, engine, start_search,
+                                                       sync_beeps, False, working_rate, fft_backend, fft_workers)
+    except NoSyncError:
+        return coder_decoder.DecodeResult(coder_decoder.STATUS_NO_SYNC, None)
+
+    return coder_decoder.try_decode(sequence)._replace(offset=offset)
+
+
+'''
+Same as try_decode_data, given a file (memory-mapped with prescreen)
+'''
+def try_decode_file(file_path, perfect_generation=False, engine='fft', start_search='window', sync_beeps=False,
+                    working_rate=None, fft_backend='numpy', fft_workers=None, prescreen=False):
+    with instrumentation.stage('read') as stage:
+        sampling_freq, data = read(file_path, mmap=prescreen)
+        stage.record(data=data)
+
+    return try_decode_data(data, sampling_freq, perfect_generation, engine, start_search, sync_beeps, working_rate,
+                           fft_backend, fft_workers, prescreen)
+
+
+'''
+Returns the start of signal (sample offset) and the string of binary digits of the first candidate region of the
+energy pre-screen (see prescreen.candidate_regions) that demodulates, with the same options as
+locate_sequence_in_data. Only the candidate regions are read and demodulated: without any, the signal is rejected
+after the pre-screen
+'''
+def locate_sequence_in_regions(data, sampling_freq, engine='fft', start_search='window', sync_beeps=False,
+                               working_rate=None, fft_backend='numpy', fft_workers=None):
+    _check_options(engine, fft_backend, start_search)
+
+    with instrumentation.stage('prescreen') as stage:
+        regions = prescreen.candidate_regions(data, sampling_freq)
+        stage.record(data=data)
+
+    for first, last in regions:
+        try:
+            signal_start_index, sequence = locate_sequence_in_data(np.asarray(data[first:last]), sampling_freq, False,
+                                                                   engine, start_search, sync_beeps, verbose=False,
+                                                                   working_rate=working_rate,
+                                                                   fft_backend=fft_backend, fft_workers=fft_workers)
+        except NoSyncError:
+            continue
+
+        return first + signal_start_index, sequence
+
+    raise NoSyncError('Could not find start of signal!')
+
+
+'''
+Returns the start of signal, binary string and confidence of every channel of multi-channel data (N, C)
+as a ChannelSequences, with the same options as get_sequence_from_data. The start of signal search, the band-pass
+filters and the bit decisions run on all channels at once, each channel keeping its own start of signal
+(by default the earliest matched filter alignment on the whole signal, sync beeps included).
+The confidence is the mean margin (dB) between the energies of the two tones over the 48 bit windows.
+combine decodes one sequence out of all the channels with a signal:
+- 'best': sequence of the channel with the highest confidence
+- 'sum': bit decisions on the sum of the tone energies of all channels, each normalized by its total energy
+'''
+def locate_sequences_in_channels(data, sampling_freq, perfect_generation=False, engine='fft', start_search='matched',
+                                 sync_beeps=True, combine=None, working_rate=None, fft_backend='numpy',
+                                 fft_workers=None):
+    _check_options(engine, fft_backend, start_search)
+    if combine is not None and combine not in combine_modes:
+        raise Exception('Unknown channel combination \'{}\''.format(combine))
+
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+
+    up, down = _resampling_factors(sampling_freq, working_rate)
+    data, sampling_freq = decimate(data, sampling_freq, working_rate)
+    channels = data.shape[1]
+
+    if perfect_generation:
+        offsets = np.zeros(channels, dtype=np.int64)
+    else:
+        with instrumentation.stage('start_search') as stage:
+            stage.record(data=data)
+
+            if start_search == 'matched':
+                offsets, _ = sync.find_channel_starts(data, sampling_freq, sync_beeps)
+            elif start_search == 'window':
+                target = _start_search_target(sampling_freq)
+                covariances = _window_covariances(data, target)
+                offsets = np.full(channels, -1, dtype=np.int64)
+
+                if covariances.shape[0] > 0:
+                    hits = covariances > np.maximum(50.0 * covariances[0], minimum_start_cov)
+                    first_hits = np.argmax(hits, axis=0)
+                    offsets = np.where(hits.any(axis=0),
+                                       first_hits * target.size + int(10 / 1000 * sampling_freq), -1)
+
+    # Channels whose signal is cut short count as channels without a signal
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+    found = (offsets >= 0) & (offsets + int(1.0 * sampling_freq) + 16 * bit_N <= data.shape[0])
+
+    energies_low, energies_high = _channel_bit_energies(data, sampling_freq, np.where(found, offsets, 0), engine,
+                                                        fft_backend, fft_workers)
+
+    # The prominent frequency is the one with the highest energy
+    bits = energies_low <= energies_high
+    confidences = np.where(found, _tone_margins(energies_low, energies_high), 0.0)
+    sequences = [detector.bits_to_sequence(bits[channel]) if found[channel] else None for channel in range(channels)]
+
+    sequence, confidence = None, 0.0
+    if combine is not None and found.any():
+        if combine == 'best':
+            best = int(np.argmax(np.where(found, confidences, -np.inf)))
+            sequence, confidence = sequences[best], float(confidences[best])
         else:
-            sequence_buffer += '1'
+            totals = (energies_low + energies_high).sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            low = (energies_low / totals)[found].sum(axis=0)
+            high = (energies_high / totals)[found].sum(axis=0)
+            sequence = detector.bits_to_sequence(low <= high)
+            confidence = float(_tone_margins(low, high))
 
-    return sequence_buffer
+    offsets = np.where(found, np.round(offsets * down / up), -1).astype(np.int64)
+    return ChannelSequences(offsets, sequences, confidences, sequence, confidence)
 
 
 '''
-Plots the waveform, filtered 0 bits and 1 bits, noise spectrum (when applicable), filtered sync beeps
+Returns the energies of the two tones in the 48 bit windows of every channel of data (N, C), each channel starting
+at its own offset, as two (C, 48) arrays: tone powers for the 'goertzel' engine, variances of the band-pass
+filtered channels for the 'fft' engine
 '''
-def plot_from_file(file_path):
-    sampling_freq, data = read(file_path)
+def _channel_bit_energies(data, sampling_freq, offsets, engine, fft_backend='numpy', fft_workers=None):
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+    rows = offsets[:, np.newaxis, np.newaxis] + detector.bit_window_starts(sampling_freq)[:, np.newaxis] \
+        + np.arange(bit_N)
+    columns = np.arange(data.shape[1])[:, np.newaxis, np.newaxis]
+
+    if engine == 'goertzel':
+        with instrumentation.stage('goertzel') as stage:
+            windows = data[rows, columns].astype(np.float64)
+            energies = (detector.tone_power(windows, low_freq, sampling_freq),
+                        detector.tone_power(windows, high_freq, sampling_freq))
+            stage.record(data=data, windows=windows)
+        return energies
+
+    with instrumentation.stage('band_pass') as stage:
+        data_2k, data_2_5k = detector.band_pass(data, sampling_freq, (low_freq, high_freq), interval=100,
+                                                fft_backend=fft_backend, workers=fft_workers)
+        stage.record(data=data, data_2k=data_2k, data_2_5k=data_2_5k)
+
+    with instrumentation.stage('bit_slicing'):
+        return np.var(data_2k[rows, columns], axis=-1), np.var(data_2_5k[rows, columns], axis=-1)
+
+
+'''
+Returns the mean margin (dB) between the energies of the two tones over the bit windows (last axis)
+'''
+def _tone_margins(energies_low, energies_high):
+    tiny = np.finfo(np.float64).tiny
+    ratios = (np.asarray(energies_high, dtype=np.float64) + tiny) / (np.asarray(energies_low, dtype=np.float64) + tiny)
+    return np.mean(np.abs(10 * np.log10(ratios)), axis=-1)
+
+
+'''
+Yields every SRC occurrence in a (possibly very long) file as a tuple (sample offset, binary sequence, InformationBlock).
+The file is memory-mapped and scanned in chunks of chunk_duration seconds, each signal is band-pass filtered
+on its own 8.1 s segment only, so peak memory does not depend on the length of the recording.
+- start_search 'window': windows above the covariance threshold are refined to the sample with the matched filter,
+  since the signal is not aligned to the windows
+- start_search 'matched': every matched filter peak of the chunk is a candidate (see sync.find_signal_starts)
+Candidates that fail decoding are dropped and the search goes on from the next one.
+With a working_rate, the file is decimated lazily, slice by slice, and offsets are still sample offsets of the file.
+With prescreen, the start of signal search only runs on the candidate regions of the energy pre-screen.
+'''
+def iter_sequences_from_file(file_path, chunk_duration=60.0, engine='fft', start_search='window', sync_beeps=False,
+                             working_rate=None, fft_backend='numpy', fft_workers=None, prescreen=False):
+    _check_options(engine, fft_backend, start_search)
+
+    with instrumentation.stage('read') as stage:
+        sampling_freq, data = read(file_path, mmap=True)
+        stage.record(data=data)
+
+    if data.ndim > 1:
+        raise Exception('Multi-channel files are not supported by the streaming decoder')
+
+    if prescreen:
+        yield from _iter_prescreened_sequences(data, sampling_freq, chunk_duration, engine, start_search, sync_beeps,
+                                               working_rate, fft_backend, fft_workers)
+        return
+
+    up, down = _resampling_factors(sampling_freq, working_rate)
+    if (up, down) != (1, 1):
+        data = _DecimatedSignal(data, up, down)
+        sampling_freq = sampling_freq * Fraction(up, down)
+        sampling_freq = int(sampling_freq) if sampling_freq.denominator == 1 else float(sampling_freq)
+
+    candidates = _iter_candidates(data, sampling_freq, chunk_duration, start_search, sync_beeps)
+
+    for signal_start_index, sequence, info_block in _iter_decoded_candidates(data, sampling_freq, candidates, engine,
+                                                                             fft_backend, fft_workers):
+        yield int(round(signal_start_index * down / up)), sequence, info_block
+
+
+'''
+Yields every SRC occurrence of the candidate regions of the energy pre-screen, see iter_sequences_from_file.
+Each region goes through the same start of signal search and decoding as a whole file
+'''
+def _iter_prescreened_sequences(data, sampling_freq, chunk_duration, engine, start_search, sync_beeps, working_rate,
+                                fft_backend, fft_workers):
+    with instrumentation.stage('prescreen') as stage:
+        regions = prescreen.candidate_regions(data, sampling_freq, chunk_duration=chunk_duration)
+        stage.record(data=data)
+
+    up, down = _resampling_factors(sampling_freq, working_rate)
+    signal_N = int(total_signal_duration / 1000 * sampling_freq)
+    next_search_index = 0
+
+    for first, last in regions:
+        first = max(first, next_search_index)
+        if last - first < signal_N:
+            continue
+
+        region, region_freq = decimate(np.asarray(data[first:last]), sampling_freq, working_rate)
+        candidates = _iter_candidates(region, region_freq, chunk_duration, start_search, sync_beeps)
+
+        for signal_start_index, sequence, info_block in _iter_decoded_candidates(region, region_freq, candidates,
+                                                                                 engine, fft_backend, fft_workers):
+            signal_start_index = first + int(round(signal_start_index * down / up))
+            next_search_index = signal_start_index + signal_N
+            yield signal_start_index, sequence, info_block
+
+
+'''
+Returns the start of signal candidates of data for the given start of signal search, see iter_sequences_from_file
+'''
+def _iter_candidates(data, sampling_freq, chunk_duration, start_search, sync_beeps):
+    if start_search == 'window':
+        return _iter_window_candidates(data, sampling_freq, chunk_duration)
+    return _iter_matched_candidates(data, sampling_freq, chunk_duration, sync_beeps)
 
-    sampling_period = 1 / sampling_freq
 
-    freq_space = fftfreq(data.size, sampling_period)
+'''
+Yields the start of signal, binary sequence and InformationBlock of every candidate that decodes with STATUS_OK,
+skipping the candidates that fall inside the last decoded signal
+'''
+def _iter_decoded_candidates(data, sampling_freq, candidates, engine, fft_backend, fft_workers):
+    signal_N = int(total_signal_duration / 1000 * sampling_freq)
+    next_search_index = 0
+
+    for signal_start_index in candidates:
+        if signal_start_index < next_search_index:
+            continue
+
+        segment = np.asarray(data[signal_start_index:signal_start_index + signal_N])
+        sequence = _demodulate_frames(segment, sampling_freq, engine, fft_backend, fft_workers)
+        if sequence is None:
+            continue
+
+        # Noise can pass the ID and parity checks with fields out of range: only valid frames are signals
+        result = coder_decoder.try_decode(sequence)
+        if result.status != coder_decoder.STATUS_OK:
+            continue
+
+        next_search_index = signal_start_index + signal_N
+        yield signal_start_index, sequence, result.info_block
+
+
+'''
+Yields the start of signal candidates of the covariance window search, chunk by chunk, refined to the sample
+'''
+def _iter_window_candidates(data, sampling_freq, chunk_duration):
+    target = _start_search_target(sampling_freq)
+    window_N = target.size
+    signal_N = int(total_signal_duration / 1000 * sampling_freq)
+
+    # Chunks are a whole number of search windows, so windows stay aligned to the file as in get_sequence_from_data
+    chunk_N = max(int(chunk_duration * sampling_freq), signal_N)
+    chunk_N -= chunk_N % window_N
+
+    template = sync.sync_template(sampling_freq)
+    template_N = template.size
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+
+    # The frames end on the last bit of the second frame, one second after the first one
+    frames_N = int(1.0 * sampling_freq) + 16 * bit_N
+
+    threshold = None
+    last_candidate = None
+
+    for chunk_start in range(0, data.size, chunk_N):
+        with instrumentation.stage('start_search') as stage:
+            chunk = np.asarray(data[chunk_start:chunk_start + chunk_N], dtype=np.float64)
+            covariances = _window_covariances(chunk, target)
+            stage.record(data=chunk)
+
+        if covariances.size == 0:
+            break
+
+        # The first window of the file is the noise reference for the whole scan. A window half a tone cycle off
+        # the bits has a negative covariance, so covariances are compared in magnitude, the reference included
+        if threshold is None:
+            threshold = max(50.0 * abs(covariances[0]), minimum_start_cov)
+
+        scores = None
+
+        for w in np.flatnonzero(np.abs(covariances) > threshold):
+            window_start = chunk_start + int(w) * window_N
+
+            # Windows inside the frames of the last candidate are part of it, whether or not it decodes
+            if last_candidate is not None and window_start < last_candidate + frames_N:
+                continue
+
+            with instrumentation.stage('start_refinement'):
+                # Scored once per chunk, from one signal before it, and only if one of its windows passed the search
+                if scores is None:
+                    scores_start = max(chunk_start - signal_N, 0)
+                    scores = sync.matched_filter(data[scores_start:chunk_start + chunk_N + 2 * bit_N + template_N - 1],
+                                                 template)
+
+                starts = _refine_signal_starts(scores, scores_start, window_start, sampling_freq)
+
+            # Other windows of the same signal refine to the same start, which is only decoded once
+            if last_candidate is not None:
+                starts = starts[starts > last_candidate]
+
+            for signal_start_index in starts:
+                last_candidate = int(signal_start_index)
+                yield last_candidate
+
+
+'''
+Yields the start of signal candidates of the matched filter search, chunk by chunk, in order of time
+'''
+def _iter_matched_candidates(data, sampling_freq, chunk_duration, sync_beeps):
+    template_N = sync.sync_template(sampling_freq, sync_beeps).size
+    chunk_N = max(int(chunk_duration * sampling_freq), int(total_signal_duration / 1000 * sampling_freq))
+
+    for chunk_start in range(0, data.size, chunk_N):
+        # Chunks overlap by one template, so that every alignment inside the chunk can be scored
+        block = data[chunk_start:chunk_start + chunk_N + template_N - 1]
+
+        with instrumentation.stage('start_search') as stage:
+            offsets, _ = sync.find_signal_starts(block, sampling_freq, top_k=None, sync_beeps=sync_beeps)
+            stage.record(data=block)
+
+        for offset in np.sort(offsets):
+            yield chunk_start + int(offset)
+
+
+'''
+Returns the start of signal search target: a 0 bit followed by a 1 bit (the ID of the first frame)
+'''
+def _start_search_target(sampling_freq):
+    # 30 ms long cos waves, shared with the modulator
+    low_30ms, high_30ms, _ = tone_templates(sampling_freq)
+    return np.concatenate([low_30ms, high_30ms])
+
+
+'''
+Returns the covariance between the target and each consecutive, non-overlapping window of the signal
+(same value as np.cov(window, target)[0, 1], computed for all windows at once).
+Multi-channel data (N, C) gives (windows, C) covariances
+'''
+def _window_covariances(data, target):
+    window_N = target.size
+    window_count = data.shape[0] // window_N
+
+    windows = np.asarray(data[:window_count * window_N], dtype=np.float64)
+    windows = windows.reshape((window_count, window_N) + windows.shape[1:])
+    windows = windows - windows.mean(axis=1, keepdims=True)
+    centered_target = target - target.mean()
+
+    return np.tensordot(windows, centered_target, axes=([1], [0])) / (window_N - 1)
+
+
+'''
+Returns the signal resampled to the working rate (Hz) with an anti-aliasing polyphase filter, together with
+the actual working rate. Signals already at or below the working rate, or without a working rate, are returned
+unchanged. The working rate is rounded to a ratio of small integers of the sampling frequency
+'''
+def decimate(data, sampling_freq, working_rate):
+    up, down = _resampling_factors(sampling_freq, working_rate)
+    if (up, down) == (1, 1):
+        return data, sampling_freq
+
+    with instrumentation.stage('decimation') as stage:
+        decimated = resample_poly(np.asarray(data, dtype=np.float32), up, down)
+        stage.record(data=data, decimated=decimated)
+
+    working_rate = sampling_freq * Fraction(up, down)
+    return decimated, int(working_rate) if working_rate.denominator == 1 else float(working_rate)
+
+
+'''
+Returns the (up, down) polyphase resampling factors from the sampling frequency to the working rate,
+(1, 1) when no decimation is needed
+'''
+def _resampling_factors(sampling_freq, working_rate):
+    if working_rate is None or working_rate >= sampling_freq:
+        return 1, 1
 
-    # Signal Spectrum
-    sig_fft = fft(data)
+    if working_rate < minimum_working_rate:
+        raise Exception('Working rate must be at least {} Hz'.format(minimum_working_rate))
 
-    # Band-pass filters for 2.0k, 2.5k and 1.0k frequencies
-    low_filter = freq_filter(low_freq, freq_space)
-    high_filter = freq_filter(high_freq, freq_space)
-    sync_filter = freq_filter(sync_freq, freq_space)
+    ratio = (Fraction(working_rate) / Fraction(sampling_freq)).limit_denominator(1000)
+    return ratio.numerator, ratio.denominator
 
-    # Processed signals
-    data_2k = np.real(ifft(low_filter * sig_fft))
-    data_2_5k = np.real(ifft(high_filter * sig_fft))
-    data_1k = np.real(ifft(sync_filter * sig_fft))
+
+'''
+Lazily decimated view of a (memory-mapped) signal: only supports its size and slicing with a step of 1,
+each slice is resampled from the input samples it depends on plus a margin covering the anti-aliasing filter,
+so that slices are identical to the same samples of the whole decimated signal (up to the signal edges)
+'''
+class _DecimatedSignal:
+
+    def __init__(self, data, up, down):
+        self.data = data
+        self.up = up
+        self.down = down
+        self.size = -(-data.size * up // down)
+
+        # Half length of the resample_poly filter, in input samples, rounded up to a multiple of down
+        margin = 10 * max(up, down) // up + 1
+        self.margin = -(-margin // down) * down
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, item):
+        start, stop, step = item.indices(self.size)
+        if step != 1:
+            raise Exception('Decimated signals only support contiguous slices')
+        if stop <= start:
+            return np.zeros(0, dtype=np.float32)
+
+        # The first input sample is a multiple of down, so that output samples fall on the global output grid
+        input_start = max((start * self.down // self.up) // self.down * self.down - self.margin, 0)
+        input_stop = min(-(-stop * self.down // self.up) + self.margin, self.data.size)
+
+        with instrumentation.stage('decimation') as stage:
+            decimated = resample_poly(np.asarray(self.data[input_start:input_stop], dtype=np.float32), self.up, self.down)
+            stage.record(decimated=decimated)
+
+        output_start = input_start // self.down * self.up
+        return decimated[start - output_start:stop - output_start]
+
+
+'''
+Returns the starts of signal around a window that passed the start of signal search, in order of time, from the
+matched filter scores on both frame IDs of the alignments starting at sample first (and on).
+The window can fall anywhere inside the signal (frames or sync beeps), so every offset from one signal length
+before the window up to the window itself is searched. Later offsets can match both frame IDs on other bits
+as well as the start of signal does, so the starts are the earliest strong alignments of the scores
+(see sync.find_signal_starts), or the best offset if none is above the floor
+'''
+def _refine_signal_starts(scores, first, window_start, sampling_freq):
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+    signal_N = int(total_signal_duration / 1000 * sampling_freq)
+
+    region_start = max(window_start - signal_N, first)
+    region = scores[region_start - first:window_start + 2 * bit_N + 1 - first]
+
+    offsets = sync.signal_starts_in_scores(region, sampling_freq, top_k=None)
+    if offsets.size > 0:
+        return region_start + offsets
+
+    if region.size == 0:
+        return np.array([window_start])
+
+    return np.array([region_start + int(np.argmax(region))])
+
+
+'''
+Returns the string of binary digits of a signal starting at the first sample of data,
+or None if data is too short to contain both frames
+'''
+def _demodulate_frames(data, sampling_freq, engine='fft', fft_backend='numpy', fft_workers=None):
+    bits = _demodulate_bits(data, sampling_freq, engine, fft_backend, fft_workers)
+    return None if bits is None else detector.bits_to_sequence(bits)
+
+
+'''
+Returns the 48 bits of a signal starting at the first sample of data as a bool numpy array,
+or None if data is too short to contain both frames
+'''
+def _demodulate_bits(data, sampling_freq, engine='fft', fft_backend='numpy', fft_workers=None):
+    energies = _demodulate_energies(data, sampling_freq, engine, fft_backend, fft_workers)
+    return None if energies is None else energies[0] <= energies[1]
+
+
+'''
+Returns the energies of the two tones (low_freq, high_freq) in the 48 bit windows of a signal starting at the first
+sample of data, as two arrays, or None if data is too short to contain both frames
+'''
+def _demodulate_energies(data, sampling_freq, engine='fft', fft_backend='numpy', fft_workers=None):
+    # Number of samples for a single bit (30 ms)
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+
+    if data.size < int(1.0 * sampling_freq) + 16 * bit_N:
+        return None
+
+    # Tone power inside the bit windows only, no full-signal transform
+    if engine == 'goertzel':
+        with instrumentation.stage('goertzel') as stage:
+            windows = detector.bit_windows(data, sampling_freq).astype(np.float64)
+            energies = (detector.tone_power(windows, low_freq, sampling_freq),
+                        detector.tone_power(windows, high_freq, sampling_freq))
+            stage.record(data=data)
+
+        return energies
+
+    # After the start of the signal has been evaluated, filter with band-pass filters
+    with instrumentation.stage('band_pass') as stage:
+        data_2k, data_2_5k = detector.band_pass(data, sampling_freq, (low_freq, high_freq), interval=100,
+                                                fft_backend=fft_backend, workers=fft_workers)
+        stage.record(data=data, data_2k=data_2k, data_2_5k=data_2_5k)
+
+    with instrumentation.stage('bit_slicing'):
+        return (detector.window_energies(data_2k, sampling_freq),
+                detector.window_energies(data_2_5k, sampling_freq))
+
+
+'''
+Plots the waveform, filtered 0 bits and 1 bits, noise spectrum (when applicable), filtered sync beeps.
+Only the samples in [start, stop) are plotted (the whole file by default), the file is memory-mapped so that
+zooming into a long recording does not load it. All band-pass filters reuse a single real forward FFT and every
+curve is drawn as a min/max envelope of at most max_points buckets, which looks like the full waveform at screen
+resolution without passing millions of points to matplotlib
+'''
+def plot_from_file(file_path, start=0, stop=None, max_points=2000):
+    import matplotlib.pyplot as plt
+
+    sampling_freq, data = read(file_path, mmap=True)
+    segment = np.asarray(data[start:stop], dtype=np.float32)
+
+    sampling_period = 1 / sampling_freq
+
+    # Signal Spectrum, positive frequencies only
+    sig_fft = np.fft.rfft(segment)
+    band = np.zeros_like(sig_fft)
+
+    # Band-pass filters for 2.0k, 2.5k and 1.0k frequencies (same bands as freq_filter, as ranges of bins).
+    # Each filtered signal is reduced to its envelope before the next one is computed, and halved to keep
+    # the scale of the full complex spectrum filtering
+    envelopes = []
+    for frequency in (low_freq, high_freq, sync_freq):
+        band_bins = slice(int(np.ceil((frequency - 100) * segment.size * sampling_period)),
+                          int(np.floor((frequency + 100) * segment.size * sampling_period)) + 1)
+        band[:] = 0
+        band[band_bins] = sig_fft[band_bins]
+        filtered = np.fft.irfft(band, segment.size)
+        filtered *= 0.5
+        envelopes.append(_minmax_envelope(filtered, start, sampling_freq, max_points))
+        del filtered
+
+    del sig_fft, band
+    envelope_2k, envelope_2_5k, envelope_1k = envelopes
 
     # Noise evaluation (relevant only if the initial signal is not ideal)
-    noise_extract = data[0:int(10 / 1000 * sampling_freq)]
+    noise_extract = segment[0:int(10 / 1000 * sampling_freq)]
     noise_freq_space = fftfreq(noise_extract.size, sampling_period)
     pos_noise_freq_space = noise_freq_space[:int(noise_freq_space.size / 2)]
     noise_sig_real_dft = np.real(fft(noise_extract))[:pos_noise_freq_space.size]
 
     # Plots
-    time_domain_x_axis = np.array([i * sampling_period for i in range(data.size)])
     fig, axs = plt.subplots(3, 2, figsize=(20, 18))
-    axs[0, 0].plot(time_domain_x_axis, data)
+    axs[0, 0].plot(*_minmax_envelope(segment, start, sampling_freq, max_points))
     axs[0, 0].set_title('Initial Signal')
-    axs[1, 0].plot(time_domain_x_axis, data_2k)
+    axs[1, 0].plot(*envelope_2k)
     axs[1, 0].set_title('Filtered 0s')
-    axs[1, 1].plot(time_domain_x_axis, data_2_5k)
+    axs[1, 1].plot(*envelope_2_5k)
     axs[1, 1].set_title('Filtered 1s')
-    axs[2, 0].plot(time_domain_x_axis, data_1k)
+    axs[2, 0].plot(*envelope_1k)
     axs[2, 0].set_title('Filtered sync beeps')
     axs[2, 1].plot(pos_noise_freq_space, noise_sig_real_dft)
     axs[2, 1].set_xlim(0,4000)
     axs[2, 1].set_title('Noise spectrum (ignore if perfect generation)')
     fig.tight_layout(pad=5.0)
     plt.show()
+
+
+'''
+Returns the time axis (seconds) and values of the min/max envelope of a signal starting at sample offset start:
+the signal is split in at most max_points buckets and each bucket is drawn as a vertical segment from its
+minimum to its maximum. Signals shorter than 2 * max_points are returned sample by sample
+'''
+def _minmax_envelope(signal, start, sampling_freq, max_points):
+    if signal.size <= 2 * max_points:
+        return (start + np.arange(signal.size)) / sampling_freq, signal
+
+    bucket_N = -(-signal.size // max_points)
+    bucket_count = signal.size // bucket_N
+    buckets = signal[:bucket_count * bucket_N].reshape(bucket_count, bucket_N)
+
+    # Trailing samples that do not fill a bucket make a shorter last bucket
+    lows, highs = buckets.min(axis=1), buckets.max(axis=1)
+    if bucket_count * bucket_N < signal.size:
+        tail = signal[bucket_count * bucket_N:]
+        lows, highs = np.append(lows, tail.min()), np.append(highs, tail.max())
+
+    bucket_starts = start + np.arange(lows.size) * bucket_N
+    time_axis = np.repeat(bucket_starts / sampling_freq, 2)
+    values = np.column_stack([lows, highs]).ravel()
+    return time_axis, values
@@ -0,0 +1,156 @@
+from numpy.fft import fft, ifft, fftfreq
+import scipy.fft
+from pyraisrc.signal_utils import *
+import numpy as np
+
+# Detector engines available to the demodulator
+engines = ('fft', 'goertzel')
+
+# FFT backends of the 'fft' engine band-pass filters
+fft_backends = ('numpy', 'scipy')
+
+
+'''
+Returns the first sample of each of the 48 bit windows (32 for the first frame, 16 for the second one)
+of a signal starting at sample 0
+'''
+def bit_window_starts(sampling_freq):
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+    frame_1_starts = np.arange(32) * bit_N
+    frame_2_starts = int(1.0 * sampling_freq) + np.arange(16) * bit_N
+    return np.concatenate([frame_1_starts, frame_2_starts])
+
+
+'''
+Returns the 48 bit windows of a signal starting at sample 0 as a (48, bit_N) array
+'''
+def bit_windows(data, sampling_freq):
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+    starts = bit_window_starts(sampling_freq)
+    return np.asarray(data)[starts[:, np.newaxis] + np.arange(bit_N)]
+
+
+'''
+Returns the energy (variance) of a signal in each of the 48 bit windows as a (..., 48) array. Frame 1 and frame 2
+(one second later) are reshaped into (bits, bit_N) views, so all energies come from a single reduction per frame.
+- signal is a single signal or a stack of signals (..., N), sharing the same bit windows
+- offsets is the first sample of the signal, or an array of K candidate offsets giving (..., K, 48) energies
+  (from cumulative sums, so the cost hardly depends on K)
+'''
+def window_energies(signal, sampling_freq, offsets=0):
+    signal = np.asarray(signal)
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+    frame_2_start = int(1.0 * sampling_freq)
+
+    if np.ndim(offsets) == 0:
+        offset = int(offsets)
+        frame1 = signal[..., offset:offset + 32 * bit_N].reshape(signal.shape[:-1] + (32, bit_N))
+        frame2 = signal[..., offset + frame_2_start:offset + frame_2_start + 16 * bit_N]
+        frame2 = frame2.reshape(signal.shape[:-1] + (16, bit_N))
+        return np.concatenate([frame1.var(axis=-1), frame2.var(axis=-1)], axis=-1)
+
+    # Candidate offsets share the cumulative sums of the signal and of its square: every window energy is
+    # E[x^2] - E[x]^2 from two differences, whatever the number of candidates
+    starts = np.asarray(offsets)[:, np.newaxis] + bit_window_starts(sampling_freq)
+    padding = [(0, 0)] * (signal.ndim - 1) + [(1, 0)]
+    signal = signal.astype(np.float64)
+    sums = np.pad(np.cumsum(signal, axis=-1), padding)
+    squares = np.pad(np.cumsum(signal * signal, axis=-1), padding)
+
+    means = (sums[..., starts + bit_N] - sums[..., starts]) / bit_N
+    return np.maximum((squares[..., starts + bit_N] - squares[..., starts]) / bit_N - means * means, 0.0)
+
+
+'''
+Returns the 48 bits as a (..., 48) bool array given the two band-pass filtered signals (see band_pass),
+deciding each bit on the energies of the two bands in its window (same options as window_energies)
+'''
+def slice_bits(data_low, data_high, sampling_freq, offsets=0):
+    # The prominent frequency is the one with the highest energy
+    return window_energies(data_low, sampling_freq, offsets) <= window_energies(data_high, sampling_freq, offsets)
+
+
+'''
+Returns the power of a single frequency in each window (last axis) with a single-bin DFT,
+equivalent to running the Goertzel algorithm on every window
+'''
+def tone_power(windows, frequency, sampling_freq):
+    phase = 2.0 * np.pi * frequency / sampling_freq * np.arange(windows.shape[-1])
+    real = windows @ np.cos(phase)
+    imag = windows @ np.sin(phase)
+    return real ** 2 + imag ** 2
+
+
+'''
+Returns the 48 bits of a signal starting at sample 0 as a bool numpy array,
+deciding each bit on the power at low_freq and high_freq inside its window
+'''
+def goertzel_bits(data, sampling_freq):
+    windows = bit_windows(data, sampling_freq).astype(np.float64)
+    power_2k = tone_power(windows, low_freq, sampling_freq)
+    power_2_5k = tone_power(windows, high_freq, sampling_freq)
+
+    # The prominent frequency is the one with the highest power
+    return power_2k <= power_2_5k
+
+
+'''
+Returns the soft decision of each bit as the natural log of the ratio between the energies of its window at
+high_freq and at low_freq: positive for 1 bits, negative for 0 bits, and the larger in magnitude the more confident.
+The energies are the ones the hard decisions compare (window_energies of the band-pass filtered signals
+or tone_power of the Goertzel engine)
+'''
+def log_energy_ratios(energies_low, energies_high):
+    tiny = np.finfo(np.float64).tiny
+    return np.log((np.asarray(energies_high, dtype=np.float64) + tiny) /
+                  (np.asarray(energies_low, dtype=np.float64) + tiny))
+
+
+'''
+Returns the string of binary digits (frames separated by a space) given the 48 bits as a bool numpy array
+'''
+def bits_to_sequence(bits):
+    digits = ''.join('1' if bit else '0' for bit in bits)
+    return digits[:32] + ' ' + digits[32:]
+
+
+'''
+Returns the signal band-pass filtered around each frequency (band of twice the interval), as a list of arrays.
+- fft_backend 'numpy': full complex spectrum of the signal as is (complex128), every filtered signal is kept
+  from the same spectrum
+- fft_backend 'scipy': real spectrum (rfft/irfft) of the signal zero-padded to the next fast length,
+  in float32/complex64 for 8, 16 and 32-bit samples, computed by scipy.fft over the given number of workers
+  (None for a single one, -1 for all CPUs). Filtered signals only differ from the numpy ones by a factor of 2
+  (the numpy filters keep the positive frequencies only) and by the padding at the end of the signal.
+Multi-channel data (N, C) is filtered along the first axis, all channels at once
+'''
+def band_pass(data, sampling_freq, frequencies, interval=100, fft_backend='numpy', workers=None):
+    data = np.asarray(data)
+    channel_axes = (1,) * (data.ndim - 1)
+
+    if fft_backend == 'numpy':
+        freq_signal = fftfreq(data.shape[0], 1 / sampling_freq)
+        sig_fft = fft(data, axis=0)
+        return [np.real(ifft(freq_filter(frequency, freq_signal, interval=interval).reshape((-1,) + channel_axes)
+                             * sig_fft, axis=0))
+                for frequency in frequencies]
+
+    if fft_backend != 'scipy':
+        raise Exception('Unknown FFT backend \'{}\''.format(fft_backend))
+
+    dtype = np.float32 if data.dtype.itemsize <= 4 and data.dtype != np.float64 else np.float64
+    N = scipy.fft.next_fast_len(data.shape[0], real=True)
+
+    sig_fft = scipy.fft.rfft(data.astype(dtype, copy=False), N, axis=0, workers=workers)
+    band = np.zeros_like(sig_fft)
+
+    filtered = []
+    for frequency in frequencies:
+        # Same band as freq_filter, as a range of bins of the padded real spectrum
+        band_bins = slice(int(np.ceil((frequency - interval) * N / sampling_freq)),
+                          int(np.floor((frequency + interval) * N / sampling_freq)) + 1)
+        band[:] = 0
+        band[band_bins] = sig_fft[band_bins]
+        filtered.append(scipy.fft.irfft(band, N, axis=0, workers=workers)[:data.shape[0]])
+
+    return filtered
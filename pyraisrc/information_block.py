@@ -1,9 +1,151 @@
 import datetime
+import numpy as np
 
 months_str = ['Invalid', 'January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
               'October', 'November', 'December']
 days_of_week = ['Invalid', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
+'''
+Record layout of a batch of InformationBlocks stored as a structured numpy array (one row per block):
+same fields as the InformationBlock, with the time zone as the OE bit and a per-row validity flag
+'''
+BLOCK_DTYPE = np.dtype([
+    ('hour', np.uint8),
+    ('minutes', np.uint8),
+    ('is_cest', np.bool_),
+    ('month', np.uint8),
+    ('day', np.uint8),
+    ('day_of_week', np.uint8),
+    ('year', np.int16),
+    ('next_tz_change', np.int8),
+    ('leap_second', np.int8),
+    ('valid', np.bool_),
+])
+
+# Two-digit year above which SRC years belong to the 20th century (None until read from the clock or set)
+_century_pivot = None
+
+# UTC offsets of the two time zones of the OE bit
+time_zones = {
+    'CET': datetime.timezone(datetime.timedelta(hours=1)),
+    'CEST': datetime.timezone(datetime.timedelta(hours=2)),
+}
+
+'''
+Sets the two-digit year above which SRC years are taken in the 20th century (e.g. 30: 00-30 are 2000-2030,
+31-99 are 1931-1999), making the century choice deterministic. With None, the current year is read again
+from the clock at the next conversion and then cached
+'''
+def set_century_pivot(pivot=None):
+    global _century_pivot
+    _century_pivot = pivot
+
+
+'''
+Returns the two-digit century pivot, reading the current year from the clock on first use only
+'''
+def century_pivot():
+    global _century_pivot
+    if _century_pivot is None:
+        _century_pivot = datetime.date.today().year - 2000
+    return _century_pivot
+
+
+'''
+Returns the full year given the two digits of the SRC year bits
+'''
+def century_year(year):
+    # 20th century
+    if year > century_pivot():
+        return year + 1900
+    # 21st century
+    else:
+        return year + 2000
+
+
+'''
+Returns the full years of an array of two-digit SRC years, as century_year
+'''
+def century_years(years):
+    years = np.asarray(years, dtype=np.int16)
+    return np.where(years > century_pivot(), years + 1900, years + 2000).astype(np.int16)
+
+
+'''
+Returns a structured array of BLOCK_DTYPE from datetimes, as InformationBlock.from_datetime does for a single one:
+datetimes is a sequence of datetime objects or a datetime64 array (wall clock time of the time zone),
+time_zone, next_tz_change and leap_second are either single values or one value per datetime
+(time_zone as 'CET'/'CEST' strings or as the OE bit)
+'''
+def blocks_from_datetime(datetimes, time_zone, next_tz_change=-1, leap_second=0):
+    if isinstance(datetimes, np.ndarray) and np.issubdtype(datetimes.dtype, np.datetime64):
+        minutes = datetimes.astype('datetime64[m]').ravel()
+    else:
+        minutes = np.array([dt.replace(tzinfo=None) for dt in datetimes], dtype='datetime64[m]')
+
+    days = minutes.astype('datetime64[D]')
+    months = minutes.astype('datetime64[M]')
+    minute_of_day = (minutes - days).astype(np.int64)
+
+    time_zone = np.asarray(time_zone)
+    is_cest = time_zone == 'CEST' if time_zone.dtype.kind in 'US' else time_zone.astype(bool)
+
+    blocks = np.zeros(minutes.size, dtype=BLOCK_DTYPE)
+    blocks['hour'] = minute_of_day // 60
+    blocks['minutes'] = minute_of_day % 60
+    blocks['is_cest'] = is_cest
+    blocks['month'] = months.astype(np.int64) % 12 + 1
+    blocks['day'] = (days - months).astype(np.int64) + 1
+    # 1970-01-01 was a Thursday
+    blocks['day_of_week'] = (days.astype(np.int64) + 3) % 7 + 1
+    blocks['year'] = minutes.astype('datetime64[Y]').astype(np.int64) + 1970
+    blocks['next_tz_change'] = next_tz_change
+    blocks['leap_second'] = leap_second
+    blocks['valid'] = True
+
+    return blocks
+
+
+'''
+Returns the wall clock time (time zone of each row) of a structured array of BLOCK_DTYPE as a datetime64[m] array.
+Rows that are not valid or whose fields are not a real date and time are NaT
+'''
+def blocks_to_datetime64(blocks):
+    years = blocks['year'].astype(np.int64)
+    months = blocks['month'].astype(np.int64)
+    days = blocks['day'].astype(np.int64)
+    hours = blocks['hour'].astype(np.int64)
+    minutes = blocks['minutes'].astype(np.int64)
+
+    ok = blocks['valid'] & (months >= 1) & (months <= 12) & (days >= 1) & (hours < 24) & (minutes < 60)
+    first_of_month = ((years - 1970) * 12 + np.where(ok, months, 1) - 1).astype('datetime64[M]')
+    ok &= days <= (first_of_month + 1).astype('datetime64[D]') - first_of_month.astype('datetime64[D]')
+
+    local = (first_of_month.astype('datetime64[D]') + (days - 1)).astype('datetime64[m]') + (hours * 60 + minutes)
+    local[~ok] = np.datetime64('NaT')
+    return local
+
+
+'''
+Returns the UTC time of a structured array of BLOCK_DTYPE as a datetime64[m] array (NaT for rows as in
+blocks_to_datetime64)
+'''
+def blocks_to_utc(blocks):
+    utc_offset = np.where(blocks['is_cest'], 120, 60)
+    return blocks_to_datetime64(blocks) - utc_offset.astype('timedelta64[m]')
+
+
+'''
+Returns the UTC epoch (seconds since 1970-01-01 00:00 UTC) of a structured array of BLOCK_DTYPE as a float64 array
+(NaN for rows as in blocks_to_datetime64)
+'''
+def blocks_to_epoch(blocks):
+    utc = blocks_to_utc(blocks)
+    epoch = utc.astype(np.int64).astype(np.float64) * 60
+    epoch[np.isnat(utc)] = np.nan
+    return epoch
+
+
 '''
 Data structure containing all information encoded in an SRC time signal
 '''
@@ -36,13 +178,7 @@ class InformationBlock:
     def set_date(self, day, month, year, day_of_week):
         self.day = day
         self.month = month
-        self.year = year
-        # 20th century
-        if year > datetime.date.today().year - 2000:
-            self.year += 1900
-        # 21st century
-        else:
-            self.year += 2000
+        self.year = century_year(year)
 
         self.day_of_week = day_of_week
 
@@ -95,8 +231,7 @@ class InformationBlock:
     Returns a datetime object with the relevant information from the InformationBlock object
     '''
     def to_datetime(self):
-        delta = datetime.timedelta(hours=1) if self.time_zone == 'CET' else datetime.timedelta(hours=2)
-        tz = datetime.timezone(delta)
+        tz = time_zones['CET'] if self.time_zone == 'CET' else time_zones['CEST']
         buffer = datetime.datetime(self.year, self.month, self.day, self.hour, self.minutes, 0, 0, tzinfo=tz)
         return buffer
 
@@ -0,0 +1,144 @@
+import collections
+import contextlib
+import contextvars
+import time
+import tracemalloc
+import numpy as np
+
+'''
+Report of a pipeline stage:
+- name: stage name ('read', 'start_search', 'band_pass', 'bit_slicing', 'goertzel', 'decode', ...)
+- wall_s, cpu_s: wall clock and CPU time spent in the stage
+- allocated_bytes: peak memory traced by tracemalloc during the stage, above the memory in use when it started
+  (None unless memory tracking is on)
+- arrays: dictionary of the arrays recorded by the stage, name -> (shape, bytes)
+'''
+StageReport = collections.namedtuple('StageReport', ['name', 'wall_s', 'cpu_s', 'allocated_bytes', 'arrays'])
+
+# Callbacks of the active instrument() contexts and memory tracking flag, empty when instrumentation is off
+_active = contextvars.ContextVar('pyraisrc_instrumentation', default=((), False))
+
+# Innermost measured stage, whose peak memory has to survive the stages nested in it
+_current = contextvars.ContextVar('pyraisrc_stage', default=None)
+
+
+'''
+Turns instrumentation on inside the context: every stage of the demodulation and decoding pipeline that runs
+in this context produces a StageReport, passed to callback (if any) and appended to the yielded list.
+With track_memory the allocations of each stage are measured with tracemalloc (started if needed, much slower).
+Nothing is printed
+
+    with instrumentation.instrument() as reports:
+        demodulator.get_sequence_from_file(path)
+'''
+@contextlib.contextmanager
+def instrument(callback=None, track_memory=False):
+    reports = []
+
+    def sink(report):
+        reports.append(report)
+        if callback is not None:
+            callback(report)
+
+    callbacks, tracking = _active.get()
+    token = _active.set((callbacks + (sink,), tracking or track_memory))
+
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    try:
+        yield reports
+    finally:
+        _active.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+'''
+Returns the context manager measuring a pipeline stage. When instrumentation is off it is a shared no-op object,
+so an instrumented stage costs a single context variable lookup
+'''
+def stage(name):
+    callbacks, tracking = _active.get()
+    if not callbacks:
+        return _disabled_stage
+    return _Stage(name, callbacks, tracking)
+
+
+'''
+Stage measured while instrumentation is on
+'''
+class _Stage:
+
+    __slots__ = ('name', 'callbacks', 'tracking', 'arrays', '_wall', '_cpu', '_memory', '_peak', '_parent', '_token')
+
+    def __init__(self, name, callbacks, tracking):
+        self.name = name
+        self.callbacks = callbacks
+        self.tracking = tracking
+        self.arrays = {}
+
+    '''
+    Records the size of arrays handled by the stage, given as keyword arguments
+    '''
+    def record(self, **arrays):
+        for key, array in arrays.items():
+            array = np.asarray(array)
+            self.arrays[key] = (array.shape, int(array.nbytes))
+
+    '''
+    The tracemalloc peak is process-wide: before resetting it, the peak reached so far is kept by the enclosing
+    stage, which takes it into account when it ends
+    '''
+    def __enter__(self):
+        self._parent = _current.get()
+        self._token = _current.set(self)
+
+        if self.tracking:
+            if self._parent is not None and self._parent.tracking:
+                self._parent._peak = max(self._parent._peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._memory = tracemalloc.get_traced_memory()[0]
+            self._peak = self._memory
+
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        _current.reset(self._token)
+
+        allocated = None
+        if self.tracking:
+            allocated = max(self._peak, tracemalloc.get_traced_memory()[1]) - self._memory
+            if self._parent is not None and self._parent.tracking:
+                self._parent._peak = max(self._parent._peak, self._memory + allocated)
+
+        report = StageReport(self.name, wall, cpu, allocated, self.arrays)
+        for callback in self.callbacks:
+            callback(report)
+
+        return False
+
+
+'''
+Stage used while instrumentation is off: every method does nothing
+'''
+class _DisabledStage:
+
+    __slots__ = ()
+
+    def record(self, **arrays):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_disabled_stage = _DisabledStage()
@@ -0,0 +1,218 @@
+import asyncio
+import collections
+import time
+from pyraisrc.signal_utils import *
+from pyraisrc import coder_decoder, detector, sync
+import numpy as np
+
+'''
+Result of the live decoder:
+- offset: first sample of the signal in the stream
+- beep_offset: first sample of the final 1 kHz sync beep in the stream (predicted from the start of signal)
+- beep_time: wall clock time (seconds since the epoch) of the final sync beep, from the arrival time of the samples
+- sequence: string of binary digits
+- info_block: decoded InformationBlock
+'''
+LiveResult = collections.namedtuple('LiveResult', ['offset', 'beep_offset', 'beep_time', 'sequence', 'info_block'])
+
+# The live decoder takes the first alignment above this score, not the best one: a match of a single frame ID
+# scores at most 1/sqrt(2), so the floor has to be above it
+live_score_floor = 0.75
+
+# Sample formats of the raw PCM streams
+sample_formats = {'int16': np.dtype('<i2'), 'float32': np.dtype('<f4')}
+
+
+'''
+Decodes SRC signals from a live raw PCM stream (asyncio StreamReader) and emits them through an async iterator:
+
+    async for result in LiveDecoder(reader, 48000):
+        print(result.beep_time, result.info_block)
+
+Samples are read in blocks of block_duration seconds and the detector runs every hop_duration seconds only,
+on the samples that arrived since the previous run: a matched filter on both frame IDs finds the start of signal
+and the bits are decided with the Goertzel engine as soon as the second frame is complete,
+so a signal is emitted at most one hop after the end of its second frame
+'''
+class LiveDecoder:
+
+    '''Basic Init'''
+    def __init__(self, reader, sampling_rate, sample_format='int16', channels=1, block_duration=0.02,
+                 hop_duration=0.25, score_floor=live_score_floor):
+        if sample_format not in sample_formats:
+            raise Exception('Unsupported sample format \'{}\''.format(sample_format))
+
+        self.reader = reader
+        self.sampling_rate = sampling_rate
+        self.dtype = sample_formats[sample_format]
+        self.channels = channels
+        self.score_floor = score_floor
+
+        self._frame_bytes = self.dtype.itemsize * channels
+        self._block_bytes = max(int(block_duration * sampling_rate), 1) * self._frame_bytes
+        self._hop_N = max(int(hop_duration * sampling_rate), 1)
+
+        self._template = sync.sync_template(sampling_rate)
+        self._bit_N = int(bit_duration / 1000 * sampling_rate)
+        self._frames_N = int(1.0 * sampling_rate) + 16 * self._bit_N
+        self._signal_N = int(total_signal_duration / 1000 * sampling_rate)
+        self._sync_N = int(sync_duration / 1000 * sampling_rate)
+
+        # Rolling detector state: samples from _buffer_start on, first alignment not scored yet, pending start of signal
+        self._buffer = np.zeros(0)
+        self._buffer_start = 0
+        self._scored_until = 0
+        self._pending = None
+        self._unprocessed = 0
+        self._partial = b''
+
+        # Last (stream sample, wall clock time) pair, used to timestamp the sync beeps
+        self._clock = (0, time.time())
+        self._results = collections.deque()
+        self._eof = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._results:
+            if self._eof:
+                raise StopAsyncIteration
+            await self._read_block()
+
+        return self._results.popleft()
+
+    '''
+    Adds samples (float numpy array, one channel) to the stream and runs the detector once a hop is complete.
+    arrival_time is the wall clock time of the last sample (now by default).
+    Returns the list of the signals decoded by this call, so the decoder can also be driven without asyncio
+    '''
+    def feed(self, samples, arrival_time=None, flush=False):
+        self._buffer = np.concatenate([self._buffer, samples])
+        self._clock = (self._buffer_start + self._buffer.size, time.time() if arrival_time is None else arrival_time)
+        self._unprocessed += samples.size
+
+        if self._unprocessed < self._hop_N and not flush:
+            return []
+
+        self._unprocessed = 0
+        return self._process()
+
+    '''
+    Reads a block of raw PCM from the stream and feeds it to the detector
+    '''
+    async def _read_block(self):
+        try:
+            raw = await self.reader.readexactly(self._block_bytes)
+        except asyncio.IncompleteReadError as e:
+            raw = e.partial
+            self._eof = True
+
+        # Keep the bytes of an incomplete sample for the next block
+        raw = self._partial + raw
+        whole = len(raw) - len(raw) % self._frame_bytes
+        self._partial = raw[whole:]
+
+        samples = np.frombuffer(raw[:whole], dtype=self.dtype).astype(np.float64)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+
+        self._results.extend(self.feed(samples, flush=self._eof))
+
+    '''
+    Runs the detector on the samples received since the previous run and returns the decoded signals
+    '''
+    def _process(self):
+        buffer_end = self._buffer_start + self._buffer.size
+        results = []
+
+        while True:
+            if self._pending is None:
+                self._pending = self._search(buffer_end)
+                if self._pending is None:
+                    break
+
+            # Wait for the end of the second frame
+            if buffer_end < self._pending + self._frames_N:
+                break
+
+            result = self._decode_pending()
+            if result is not None:
+                results.append(result)
+
+        # Only the samples that can still be part of a signal are kept
+        keep_from = self._pending if self._pending is not None else self._scored_until
+        drop = min(max(keep_from - self._buffer_start, 0), self._buffer.size)
+        self._buffer = self._buffer[drop:]
+        self._buffer_start += drop
+
+        return results
+
+    '''
+    Scores the new alignments and returns the start of signal of the first peak above the score floor, if any.
+    The peak is the best alignment within one bit of the first one above the floor: later alignments
+    can match both frame IDs on other bits, but never before the start of signal
+    '''
+    def _search(self, buffer_end):
+        first = self._scored_until
+        last = buffer_end - self._template.size
+        if last < first:
+            return None
+
+        region = self._buffer[first - self._buffer_start:last - self._buffer_start + self._template.size]
+        scores = sync.matched_filter(region, self._template)
+        hits = np.flatnonzero(scores >= self.score_floor)
+
+        if hits.size == 0:
+            self._scored_until = last + 1
+            return None
+
+        hit = int(hits[0])
+        if hit + self._bit_N > scores.size:
+            # The neighbourhood of the peak has not been received yet
+            self._scored_until = first + hit
+            return None
+
+        return first + hit + int(np.argmax(scores[hit:hit + self._bit_N]))
+
+    '''
+    Decides the bits of the pending signal and returns its LiveResult, or None if it does not decode
+    '''
+    def _decode_pending(self):
+        start = self._pending - self._buffer_start
+        bits = detector.goertzel_bits(self._buffer[start:start + self._frames_N], self.sampling_rate)
+        sequence = detector.bits_to_sequence(bits)
+
+        decoded = coder_decoder.try_decode(sequence)
+        if decoded.status != coder_decoder.STATUS_OK:
+            # Not a signal (fields out of range included): go on searching after this alignment
+            self._scored_until = self._pending + self._bit_N
+            self._pending = None
+            return None
+
+        beep_offset = self._pending + self._signal_N - self._sync_N
+        clock_sample, clock_time = self._clock
+        beep_time = clock_time + (beep_offset - clock_sample) / self.sampling_rate
+
+        result = LiveResult(self._pending, beep_offset, beep_time, sequence, decoded.info_block)
+        self._scored_until = self._pending + self._signal_N
+        self._pending = None
+        return result
+
+
+'''
+Returns a LiveDecoder reading raw PCM from a local TCP socket (e.g. a capture box)
+'''
+async def open_tcp_decoder(host, port, sampling_rate, **kwargs):
+    reader, _ = await asyncio.open_connection(host, port)
+    return LiveDecoder(reader, sampling_rate, **kwargs)
+
+
+'''
+Returns a LiveDecoder reading raw PCM from a pipe or binary file object (e.g. sys.stdin.buffer)
+'''
+async def open_pipe_decoder(pipe, sampling_rate, **kwargs):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return LiveDecoder(reader, sampling_rate, **kwargs)
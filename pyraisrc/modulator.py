@@ -1,6 +1,9 @@
+import functools
 import pyraisrc.signal_utils as signal_utils
+from pyraisrc import coder_decoder
 import numpy as np
 import scipy.io.wavfile as wav
+import struct
 
 '''
 Returns a string sequence of binary digits given two bool frames
@@ -26,13 +29,9 @@ def generate_waveform(frame1, frame2, sampling_rate, amplitude = 1.0):
     N = int(signal_utils.total_signal_duration / 1000 * sampling_rate)
     waveform = np.zeros(N, dtype=np.float32)
 
-    period = 1.0 / sampling_rate
-
-    # 30 ms long cos waves are precalculated and applied when needed
+    # 30 ms long cos waves and sync beep are precalculated once per sampling rate and amplitude
+    low_30ms, high_30ms, sync_wave = signal_utils.tone_templates(sampling_rate, amplitude)
     bit_N = int(signal_utils.bit_duration / 1000 * sampling_rate)
-    bit_samples = np.arange(0, bit_N * period, period).astype(np.float32)
-    low_30ms = np.cos(2.0 * np.pi * signal_utils.low_freq * bit_samples) * amplitude
-    high_30ms = np.cos(2.0 * np.pi * signal_utils.high_freq * bit_samples) * amplitude
 
     # First frame
     for i in range(32):
@@ -53,12 +52,8 @@ def generate_waveform(frame1, frame2, sampling_rate, amplitude = 1.0):
         pitch = high_30ms if frame2[i] == 1 else low_30ms
         waveform[t:tp] = pitch
 
-    # Sync beeps (precalculated as before
-    sync_N = int(signal_utils.sync_duration / 1000 * sampling_rate)
-    sync_samples = np.arange(0, sync_N * period, period).astype(np.float32)
-    sync_wave = np.cos(2 * np.pi * signal_utils.sync_freq * sync_samples) * amplitude
-
     # the beeps start at second 54 (two seconds after start of signal)
+    sync_N = int(signal_utils.sync_duration / 1000 * sampling_rate)
     k = 2 * sampling_rate
 
     for i in range(5):
@@ -73,6 +68,39 @@ def generate_waveform(frame1, frame2, sampling_rate, amplitude = 1.0):
     return waveform
 
 
+'''
+Returns the waveform of the two frames (bool numpy arrays) from a cache of the waveform_cache_size most recently
+requested ones, keyed by the packed frame bits, sampling rate and amplitude. Repeated requests for the same minute
+share one read-only array: copy it before modifying
+'''
+def cached_waveform(frame1, frame2, sampling_rate, amplitude=1.0):
+    global _waveform_cache
+
+    # The cache is built on first use, and built again (empty) when waveform_cache_size has changed
+    if _waveform_cache is None or _waveform_cache[0] != waveform_cache_size:
+        _waveform_cache = (waveform_cache_size, functools.lru_cache(maxsize=waveform_cache_size)(_packed_waveform))
+
+    bits = np.concatenate([np.asarray(frame1, dtype=bool), np.asarray(frame2, dtype=bool)])
+    return _waveform_cache[1](np.packbits(bits).tobytes(), sampling_rate, amplitude)
+
+
+# Number of waveforms kept by cached_waveform, can be changed at any time
+waveform_cache_size = 256
+
+# (size, cached function) of cached_waveform
+_waveform_cache = None
+
+
+'''
+Returns the read-only waveform of the 48 frame bits packed in 6 bytes, see cached_waveform
+'''
+def _packed_waveform(packed_bits, sampling_rate, amplitude):
+    bits = np.unpackbits(np.frombuffer(packed_bits, dtype=np.uint8), count=48).astype(bool)
+    waveform = generate_waveform(bits[:32], bits[32:], sampling_rate, amplitude)
+    waveform.flags.writeable = False
+    return waveform
+
+
 '''
 Saves a wav file to the file path given the sampling rate.
 Waveforms generated by the previous method are encoded as
@@ -80,3 +108,88 @@ Waveforms generated by the previous method are encoded as
 '''
 def save_waveform_to_file(waveform, file_path, sampling_rate=44100):
     wav.write(file_path, sampling_rate, waveform.astype(np.float32))
+
+
+'''
+Streams a synthetic broadcast timeline of duration seconds to a WAV file (or raw PCM when raw is True).
+schedule is an iterable of (start time in seconds, InformationBlock) sorted by start time: each block is encoded
+and its waveform is placed at its start time, the rest of the timeline is silence or gaussian noise (noise_level).
+sink is either a file path or a writable binary file object. Samples are written in blocks of block_size samples,
+as 32-bit floating-point or, with sample_format 'int16', as 16-bit PCM, so memory does not depend on the duration
+'''
+def write_timeline(schedule, sink, duration, sampling_rate=44100, amplitude=1.0, noise_level=0.0,
+                   sample_format='float32', raw=False, block_size=1 << 16, seed=None):
+    if sample_format not in ('float32', 'int16'):
+        raise Exception('Unsupported sample format \'{}\''.format(sample_format))
+
+    if isinstance(sink, str):
+        with open(sink, 'wb') as file:
+            write_timeline(schedule, file, duration, sampling_rate, amplitude, noise_level, sample_format, raw,
+                           block_size, seed)
+        return
+
+    total_N = int(duration * sampling_rate)
+    rng = np.random.default_rng(seed)
+
+    if not raw:
+        sink.write(_wav_header(total_N, sampling_rate, sample_format))
+
+    # Signals overlapping the current block, as (first sample, waveform)
+    active = []
+    schedule = iter(schedule)
+    pending = next(schedule, None)
+
+    for block_start in range(0, total_N, block_size):
+        block_end = min(block_start + block_size, total_N)
+
+        if noise_level > 0.0:
+            block = rng.standard_normal(block_end - block_start, dtype=np.float32) * np.float32(noise_level)
+        else:
+            block = np.zeros(block_end - block_start, dtype=np.float32)
+
+        while pending is not None and int(pending[0] * sampling_rate) < block_end:
+            frame1, frame2 = coder_decoder.encode(pending[1])
+            active.append((int(pending[0] * sampling_rate), generate_waveform(frame1, frame2, sampling_rate, amplitude)))
+            pending = next(schedule, None)
+
+        for first, waveform in active:
+            begin = max(first, block_start)
+            end = min(first + waveform.size, block_end)
+            if begin < end:
+                block[begin - block_start:end - block_start] += waveform[begin - first:end - first]
+
+        active = [(first, waveform) for first, waveform in active if first + waveform.size > block_end]
+
+        if sample_format == 'int16':
+            block = np.round(np.clip(block, -1.0, 1.0) * 32767.0).astype('<i2')
+        else:
+            block = block.astype('<f4')
+
+        sink.write(block.tobytes())
+
+
+'''
+Returns the header of a mono WAV file with N samples, 16-bit PCM or 32-bit floating-point.
+Files larger than 4 GiB (a day of 16-bit audio at 44.1 kHz) do not fit the 32-bit sizes of RIFF: they get
+an RF64 header, whose ds64 chunk carries the 64-bit sizes while the 32-bit ones are set to 0xFFFFFFFF
+'''
+def _wav_header(N, sampling_rate, sample_format):
+    if sample_format == 'int16':
+        format_tag, bits = 1, 16
+        fmt = struct.pack('<HHIIHH', format_tag, 1, sampling_rate, sampling_rate * 2, 2, bits)
+        fact = b''
+    else:
+        format_tag, bits = 3, 32
+        # Non-PCM formats carry the extension size and a fact chunk with the number of samples
+        fmt = struct.pack('<HHIIHHH', format_tag, 1, sampling_rate, sampling_rate * 4, 4, bits, 0)
+        fact = b'fact' + struct.pack('<II', 4, min(N, 0xFFFFFFFF))
+
+    data_size = N * bits // 8
+    chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt + fact + b'data'
+    riff_size = 4 + len(chunks) + 4 + data_size
+
+    if riff_size <= 0xFFFFFFFF:
+        return b'RIFF' + struct.pack('<I', riff_size) + b'WAVE' + chunks + struct.pack('<I', data_size)
+
+    ds64 = b'ds64' + struct.pack('<IQQQI', 28, riff_size + 36, data_size, N, 0)
+    return b'RF64' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' + ds64 + chunks + struct.pack('<I', 0xFFFFFFFF)
@@ -0,0 +1,159 @@
+import collections
+import datetime
+from scipy.io.wavfile import read
+from pyraisrc.signal_utils import *
+from pyraisrc import coder_decoder, demodulator, detector, modulator, sync
+from pyraisrc.information_block import InformationBlock
+import numpy as np
+
+'''
+Result of the predictive monitor:
+- offset: first sample of the signal (in the stream or file)
+- sequence: string of binary digits
+- info_block: decoded InformationBlock
+- verified: True if the signal matched the prediction, False if it was found by full demodulation
+- score: normalized correlation with the predicted waveform (0.0 for full demodulation)
+'''
+MonitorResult = collections.namedtuple('MonitorResult', ['offset', 'sequence', 'info_block', 'verified', 'score'])
+
+# Lowest correlation with the predicted waveform for an alignment to be checked bit by bit
+prediction_score_floor = 0.5
+
+
+'''
+Continuous monitoring of a station: once a signal has been decoded, the next one is predicted (period seconds later,
+one minute by default) with coder_decoder.encode and modulator.cached_waveform, aligned by correlating the frames
+of the predicted waveform around their expected position only, and verified by comparing the Goertzel bits at that
+alignment with the predicted frames. Full demodulation (matched filter search with sync beeps, then decode) only runs
+for the first signal and whenever the verification fails, e.g. after a gap, a time zone change or a wrong prediction
+'''
+class PredictiveMonitor:
+
+    '''Basic Init'''
+    def __init__(self, sampling_rate, period=60.0, margin=0.05, engine='goertzel',
+                 score_floor=prediction_score_floor):
+        self.sampling_rate = sampling_rate
+        self.period = period
+        self.engine = engine
+        self.score_floor = score_floor
+
+        self._period_N = int(round(period * sampling_rate))
+        self._margin_N = int(round(margin * sampling_rate))
+        self._signal_N = int(total_signal_duration / 1000 * sampling_rate)
+
+        # The prediction is aligned on the two frames only (the beeps are the same in every signal)
+        self._frames_N = int(1.0 * sampling_rate) + 16 * int(bit_duration / 1000 * sampling_rate)
+
+        # Last accepted signal
+        self.last_offset = None
+        self.last_block = None
+
+        self.verified = 0
+        self.demodulated = 0
+
+    '''
+    Returns the expected InformationBlock of the next signal: the last one plus the period,
+    with the same time zone, time zone change and leap second information
+    '''
+    def predict(self):
+        dt = self.last_block.to_datetime() + datetime.timedelta(seconds=self.period)
+        return InformationBlock.from_datetime(dt.replace(tzinfo=None), self.last_block.time_zone,
+                                              self.last_block.next_tz_change, self.last_block.leap_second)
+
+    '''
+    Returns the MonitorResult of the signal in data (first sample of data at sample offset of the stream),
+    or None if no signal was found. The prediction is tried first when the expected position of the next signal
+    falls inside data
+    '''
+    def process(self, data, offset=0):
+        data = np.asarray(data)
+
+        result = None
+        if self.last_block is not None:
+            result = self._verify(data, offset)
+        if result is None:
+            result = self._demodulate(data, offset)
+        if result is None:
+            return None
+
+        self.last_offset = result.offset
+        self.last_block = result.info_block
+        if result.verified:
+            self.verified += 1
+        else:
+            self.demodulated += 1
+        return result
+
+    '''
+    Returns the MonitorResult of the predicted signal, or None if it is not where and what was predicted
+    '''
+    def _verify(self, data, offset):
+        expected = self.last_offset + self._period_N - offset
+        first = max(expected - self._margin_N, 0)
+        segment = data[first:expected + self._margin_N + self._frames_N]
+        if segment.size < self._frames_N or first + self._signal_N > data.shape[0]:
+            return None
+
+        info_block = self.predict()
+        frame1, frame2 = coder_decoder.encode(info_block)
+        template = modulator.cached_waveform(frame1, frame2, self.sampling_rate)[:self._frames_N].astype(np.float64)
+
+        scores = sync.matched_filter(segment, template)
+        best = int(np.argmax(scores))
+        if scores[best] < self.score_floor:
+            return None
+
+        start = first + best
+        bits = detector.goertzel_bits(data[start:start + self._signal_N], self.sampling_rate)
+        if not np.array_equal(bits, np.concatenate([frame1, frame2])):
+            return None
+
+        return MonitorResult(offset + start, detector.bits_to_sequence(bits), info_block, True, float(scores[best]))
+
+    '''
+    Returns the MonitorResult of a full demodulation of data, or None if no signal decodes with STATUS_OK
+    '''
+    def _demodulate(self, data, offset):
+        result = demodulator.try_decode_data(data, self.sampling_rate, engine=self.engine, start_search='matched',
+                                             sync_beeps=True)
+        # A block with fields out of range cannot be predicted from
+        if result.status != coder_decoder.STATUS_OK:
+            return None
+
+        return MonitorResult(offset + result.offset, result.sequence, result.info_block, False, 0.0)
+
+
+'''
+Yields the MonitorResult of every signal of a (possibly very long) recording with one signal every period seconds.
+The file is memory-mapped: after the first signal, only the samples around the expected position of the next one
+are read and verified; when the verification fails, the next period is demodulated in full
+'''
+def monitor_file(file_path, period=60.0, margin=0.05, engine='goertzel'):
+    sampling_freq, data = read(file_path, mmap=True)
+    monitor = PredictiveMonitor(sampling_freq, period, margin, engine)
+
+    period_N = monitor._period_N
+    signal_N = monitor._signal_N
+    position = 0
+
+    while position + signal_N <= data.size:
+        # Once a prediction has failed, the scan has moved past its position: periods are demodulated in full
+        # until a signal is found again
+        expected = monitor.last_offset + period_N if monitor.last_offset is not None else None
+        if expected is not None and expected >= position:
+            first = max(expected - monitor._margin_N, 0)
+            result = monitor.process(data[first:expected + monitor._margin_N + signal_N], first)
+
+            if result is not None:
+                position = result.offset + signal_N
+                yield result
+                continue
+
+        # Full demodulation of one period (and the signal that may straddle its end)
+        result = monitor.process(data[position:position + period_N + signal_N], position)
+        if result is None:
+            position += period_N
+            continue
+
+        position = result.offset + signal_N
+        yield result
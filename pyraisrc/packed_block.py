@@ -0,0 +1,157 @@
+import functools
+from pyraisrc import coder_decoder
+from pyraisrc.coder_decoder import OR, MI, OE, P1, ME, GM, GS, P2, AN, SE, SI, OR_VALUES, MI_VALUES, ME_VALUES, \
+    GM_VALUES, GS_VALUES, AN_VALUES, SE_VALUES, pack_frames, unpack_frames, string_to_binary_frames
+from pyraisrc.information_block import InformationBlock, century_year
+
+
+'''
+Compact, immutable version of the InformationBlock: the two frames are stored as a single 48-bit integer
+(see coder_decoder.pack_frames) and every field is decoded from it only when accessed.
+Blocks compare equal and hash by their frame bits, and are ordered chronologically
+'''
+@functools.total_ordering
+class PackedInformationBlock:
+
+    __slots__ = ('packed',)
+
+    '''Init from the 48-bit packed frames'''
+    def __init__(self, packed):
+        object.__setattr__(self, 'packed', int(packed))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('PackedInformationBlock is immutable')
+
+    '''
+    Returns a PackedInformationBlock given the two frames as bool numpy arrays
+    '''
+    @staticmethod
+    def from_frames(frame1, frame2):
+        return PackedInformationBlock(pack_frames(frame1, frame2))
+
+    '''
+    Returns a PackedInformationBlock given a binary string as returned by the demodulator
+    '''
+    @staticmethod
+    def from_sequence(binary_string: str):
+        return PackedInformationBlock.from_frames(*string_to_binary_frames(binary_string))
+
+    '''
+    Returns a PackedInformationBlock with the same information as the InformationBlock
+    '''
+    @staticmethod
+    def from_information_block(info_block: InformationBlock):
+        return PackedInformationBlock.from_frames(*coder_decoder.encode(info_block))
+
+    '''
+    Returns the two frames (separately) as bool numpy arrays
+    '''
+    def to_frames(self):
+        return unpack_frames(self.packed)
+
+    '''
+    Returns an InformationBlock object with the same information
+    '''
+    def to_information_block(self):
+        info_block = InformationBlock()
+        info_block.hour = self.hour
+        info_block.minutes = self.minutes
+        info_block.time_zone = self.time_zone
+        info_block.month = self.month
+        info_block.day = self.day
+        info_block.day_of_week = self.day_of_week
+        info_block.year = self.year
+        info_block.next_tz_change = self.next_tz_change
+        info_block.leap_second = self.leap_second
+        return info_block
+
+    '''
+    Returns True if the frame IDs and the P1, P2 and PA parity bits are correct
+    '''
+    def is_valid(self):
+        frame1 = self.packed >> 16
+        frame2 = self.packed & 0xFFFF
+
+        # Odd parity over the bits covered by each parity bit, parity bit included
+        p1_ok = (frame1 >> (31 - P1)).bit_count() % 2 == 1
+        p2_ok = ((frame1 >> (31 - P2)) & 0x7FFF).bit_count() % 2 == 1
+        pa_ok = frame2.bit_count() % 2 == 1
+
+        return frame1 >> 30 == 0b01 and frame2 >> 14 == 0b10 and p1_ok and p2_ok and pa_ok
+
+    @property
+    def hour(self):
+        return self._field(OR, OR_VALUES)
+
+    @property
+    def minutes(self):
+        return self._field(MI, MI_VALUES)
+
+    @property
+    def time_zone(self):
+        return 'CEST' if self._bit(OE) else 'CET'
+
+    @property
+    def month(self):
+        return self._field(ME, ME_VALUES)
+
+    @property
+    def day(self):
+        return self._field(GM, GM_VALUES)
+
+    @property
+    def day_of_week(self):
+        return self._field(GS, GS_VALUES)
+
+    @property
+    def year(self):
+        return century_year(self._field([32 + i for i in AN], AN_VALUES))
+
+    @property
+    def next_tz_change(self):
+        next_tz_change = self._field([32 + i for i in SE], SE_VALUES)
+        return next_tz_change if next_tz_change < 7 else -1
+
+    @property
+    def leap_second(self):
+        return +1 * self._bit(32 + SI[0]) - 2 * self._bit(32 + SI[1])
+
+    '''
+    Returns the bit at the given position (0 to 47, frame 1 then frame 2) as an int
+    '''
+    def _bit(self, position):
+        return (self.packed >> (47 - position)) & 1
+
+    '''
+    Returns the value of a coded integer field given its bit positions and bit values
+    '''
+    def _field(self, positions, bit_values):
+        return sum(int(value) for position, value in zip(positions, bit_values) if self._bit(position))
+
+    '''
+    Returns the key used for chronological ordering (frame bits as a tie-break)
+    '''
+    def _sort_key(self):
+        return self.year, self.month, self.day, self.hour, self.minutes, self.packed
+
+    def __eq__(self, other):
+        if not isinstance(other, PackedInformationBlock):
+            return NotImplemented
+        return self.packed == other.packed
+
+    def __lt__(self, other):
+        if not isinstance(other, PackedInformationBlock):
+            return NotImplemented
+        return self._sort_key() < other._sort_key()
+
+    def __hash__(self):
+        return hash(self.packed)
+
+    def __int__(self):
+        return self.packed
+
+    def __repr__(self):
+        return 'PackedInformationBlock(0x{:012x})'.format(self.packed)
+
+    def __str__(self):
+        return str(self.to_information_block())
@@ -0,0 +1,214 @@
+from scipy.io.wavfile import read
+from scipy.signal import find_peaks
+from pyraisrc.signal_utils import *
+import numpy as np
+
+# Hop (and length) of the coarse energy grid, in ms: 1 kHz, 2 kHz and 2.5 kHz are whole numbers of cycles
+hop_duration = 10
+
+# Lowest pattern score of a candidate region
+minimum_score = 0.05
+
+# Samples kept before and after a candidate when its region is handed to the demodulator, in seconds
+region_margin = 0.5
+
+
+'''
+Returns the coarse band energies of a signal, one value per hop_duration ms frame: (sync, low, high, total) arrays,
+with the energies at 1 kHz (sync beeps), 2 kHz and 2.5 kHz (bits) projected on each frame and the total energy
+of the frame. The projections are a single matrix product per chunk of chunk_duration seconds, so a memory-mapped
+file is read only once and never converted to floating point as a whole.
+Multi-channel data (N, C) gives the energies summed over the channels
+'''
+def band_energies(data, sampling_freq, chunk_duration=60.0):
+    hop_N = int(hop_duration / 1000 * sampling_freq)
+    frame_count = data.shape[0] // hop_N
+
+    t = np.arange(hop_N) / sampling_freq
+    frequencies = np.array([sync_freq, low_freq, high_freq])
+    phases = 2.0 * np.pi * frequencies * t[:, np.newaxis]
+    basis = np.concatenate([np.cos(phases), np.sin(phases)], axis=1).astype(np.float32)
+
+    energies = np.zeros((frame_count, 4))
+    chunk_frames = max(int(chunk_duration * sampling_freq) // hop_N, 1)
+
+    for first in range(0, frame_count, chunk_frames):
+        last = min(first + chunk_frames, frame_count)
+        frames = np.asarray(data[first * hop_N:last * hop_N], dtype=np.float32)
+        frames = frames.reshape((last - first, hop_N, -1))
+
+        projections = np.einsum('fnc,nk->fkc', frames, basis, optimize=True).astype(np.float64)
+        band = (projections[:, :3] ** 2 + projections[:, 3:] ** 2).sum(axis=-1) * (2.0 / hop_N)
+
+        energies[first:last, :3] = band
+        energies[first:last, 3] = np.einsum('fnc,fnc->f', frames, frames, dtype=np.float64)
+
+    return energies[:, 0], energies[:, 1], energies[:, 2], energies[:, 3]
+
+
+'''
+Returns the SRC pattern score of every frame of the coarse grid, as a possible start of signal: the lowest of
+- the share of the frame energy at 2 and 2.5 kHz during the two frames, minus the one before the first beep
+- the share of the frame energy at 1 kHz during the six sync beeps, minus the one between the beeps
+Scores are close to 1 for a clean signal, still about 0.1 with white noise 10 dB above the tones,
+and close to 0 for noise, silence or program audio without the pattern.
+Only the frames followed by a whole signal are scored
+'''
+def pattern_scores(energies, sampling_freq):
+    sync, low, high, total = energies
+    bit_windows, quiet_windows, beep_windows, gap_windows = _pattern_windows(sampling_freq)
+
+    M = sync.size - _pattern_span(sampling_freq)
+    if M <= 0:
+        return np.zeros(0)
+
+    floor = np.finfo(np.float64).tiny + 1e-12 * np.max(total)
+    bit_share = np.minimum((low + high) / (total + floor), 1.0)
+    sync_share = np.minimum(sync / (total + floor), 1.0)
+
+    return np.minimum(_window_means(bit_share, bit_windows, M) - _window_means(bit_share, quiet_windows, M),
+                      _window_means(sync_share, beep_windows, M) - _window_means(sync_share, gap_windows, M))
+
+
+'''
+Yields the pattern scores of a signal chunk by chunk, as (first frame, scores): the band energies of each chunk
+of chunk_duration seconds are appended to the energies of the frames not scored yet (the last signal length
+of the previous chunk), so that every frame is scored once and memory does not depend on the length of the signal
+'''
+def iter_pattern_scores(data, sampling_freq, chunk_duration=60.0):
+    hop_N = int(hop_duration / 1000 * sampling_freq)
+    chunk_N = max(int(chunk_duration * sampling_freq) // hop_N, 1) * hop_N
+    frame_count = data.shape[0] // hop_N
+
+    first = 0
+    tail = np.zeros((4, 0))
+
+    for chunk_start in range(0, frame_count * hop_N, chunk_N):
+        chunk = band_energies(data[chunk_start:min(chunk_start + chunk_N, frame_count * hop_N)], sampling_freq,
+                              chunk_duration)
+        energies = np.concatenate([tail, chunk], axis=1)
+
+        scores = pattern_scores(energies, sampling_freq)
+        yield first, scores
+
+        first += scores.size
+        tail = energies[:, scores.size:]
+
+
+'''
+Returns the sample offsets and scores of the candidate regions of a signal (best first): starts of signal
+(to within one frame of the coarse grid) with a pattern score of at least score_floor, one signal apart at least
+'''
+def find_candidates(data, sampling_freq, score_floor=minimum_score, chunk_duration=60.0):
+    hop_N = int(hop_duration / 1000 * sampling_freq)
+    signal_frames = int(total_signal_duration / hop_duration)
+
+    peaks, peak_scores = [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+
+    for first, scores in iter_pattern_scores(data, sampling_freq, chunk_duration):
+        # Peaks are searched on a padded copy, so that a candidate at either end of the chunk can be found
+        chunk_peaks, _ = find_peaks(np.pad(scores, 1, constant_values=-np.inf), height=score_floor,
+                                    distance=signal_frames)
+        chunk_peaks -= 1
+
+        peaks.append(first + chunk_peaks)
+        peak_scores.append(scores[chunk_peaks])
+
+    peaks, peak_scores = _distant_peaks(np.concatenate(peaks), np.concatenate(peak_scores), signal_frames)
+
+    order = np.argsort(peak_scores, kind='stable')[::-1]
+    return peaks[order] * hop_N, peak_scores[order]
+
+
+'''
+Returns the (first, last) sample ranges of the candidate regions of a signal, sorted by position: each candidate
+with region_margin seconds on both sides, clipped to the signal. They are the only parts of the signal
+that need to go through the demodulator
+'''
+def candidate_regions(data, sampling_freq, score_floor=minimum_score, chunk_duration=60.0):
+    offsets, _ = find_candidates(data, sampling_freq, score_floor, chunk_duration)
+    margin_N = int(region_margin * sampling_freq)
+    signal_N = int(total_signal_duration / 1000 * sampling_freq)
+
+    return [(max(int(offset) - margin_N, 0), min(int(offset) + signal_N + margin_N, data.shape[0]))
+            for offset in np.sort(offsets)]
+
+
+'''
+Returns the sampling rate and candidate regions of a file (see candidate_regions), memory-mapped so that
+a file without SRC is rejected after a single pass over its samples
+'''
+def screen_file(file_path, score_floor=minimum_score, chunk_duration=60.0):
+    sampling_freq, data = read(file_path, mmap=True)
+    return sampling_freq, candidate_regions(data, sampling_freq, score_floor, chunk_duration)
+
+
+'''
+Returns True if the signal has at least one candidate region
+'''
+def has_signal(data, sampling_freq, score_floor=minimum_score):
+    return find_candidates(data, sampling_freq, score_floor)[0].size > 0
+
+
+'''
+Returns the (first, last) frame windows of the pattern score, relative to the start of signal: bits, quiet part
+before the first beep, beeps and gaps between the beeps. Frames are fully inside each part of the signal,
+whatever the position of the start of signal within its frame
+'''
+def _pattern_windows(sampling_freq):
+    hop = int(hop_duration / 1000 * sampling_freq) / sampling_freq
+
+    def frames(begin, end):
+        return int(round(begin / hop)) + 1, int(round(end / hop)) - 2
+
+    frame_2_end = 1.0 + 16 * bit_duration / 1000
+    bit_windows = [frames(0.0, 32 * bit_duration / 1000), frames(1.0, frame_2_end)]
+    quiet_windows = [frames(frame_2_end + 0.1, 2.0 - 0.1)]
+    beep_starts = [2.0, 3.0, 4.0, 5.0, 6.0, total_signal_duration / 1000 - sync_duration / 1000]
+    beep_windows = [frames(start, start + sync_duration / 1000) for start in beep_starts]
+    gap_windows = [frames(start + sync_duration / 1000 + 0.1, start + 1.0 - 0.1) for start in beep_starts[:5]]
+
+    return bit_windows, quiet_windows, beep_windows, gap_windows
+
+
+'''
+Returns the number of frames after a start of signal needed to score it
+'''
+def _pattern_span(sampling_freq):
+    return max(last for _, last in _pattern_windows(sampling_freq)[2])
+
+
+'''
+Returns the peaks (and their scores) left once the lower of any two peaks closer than distance frames is dropped,
+highest first, the same selection as the distance of find_peaks for peaks found in different chunks
+'''
+def _distant_peaks(peaks, scores, distance):
+    order = np.argsort(peaks, kind='stable')
+    peaks, scores = peaks[order], scores[order]
+    keep = np.ones(peaks.size, dtype=bool)
+
+    for i in np.argsort(scores, kind='stable')[::-1]:
+        if not keep[i]:
+            continue
+        lower = np.searchsorted(peaks, peaks[i] - distance, side='right')
+        upper = np.searchsorted(peaks, peaks[i] + distance, side='left')
+        keep[lower:upper] = False
+        keep[i] = True
+
+    return peaks[keep], scores[keep]
+
+
+'''
+Returns the mean of values over the given (first, last) frame windows (relative to the start of signal),
+for each of the M possible starts of signal
+'''
+def _window_means(values, windows, M):
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    total = np.zeros(M)
+    count = 0
+
+    for first, last in windows:
+        total += cumulative[last + 1:last + 1 + M] - cumulative[first:first + M]
+        count += last - first + 1
+
+    return total / count
@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 
 low_freq = 2e+3  # Hz
@@ -10,6 +11,33 @@ pause_to_sync = 520 # ms
 total_signal_duration = 8.1e+3 # ms
 sync_duration = 0.1e+3 # ms
 
+# Number of (sampling rate, amplitude) tone tables kept by tone_templates, fixed when the module is loaded
+tone_cache_size = 64
+
+
+'''
+Returns the 30 ms low and high tones and the 100 ms sync beep as float numpy arrays, scaled by amplitude.
+The tables of the tone_cache_size most recent sampling rates and amplitudes are kept and shared by the modulator,
+the demodulator and the matched filter, so they are read-only: copy them before modifying
+'''
+@functools.lru_cache(maxsize=tone_cache_size)
+def tone_templates(sampling_rate, amplitude=1.0):
+    period = 1.0 / sampling_rate
+
+    bit_N = int(bit_duration / 1000 * sampling_rate)
+    bit_samples = np.arange(0, bit_N * period, period).astype(np.float32)
+    low_30ms = np.cos(2.0 * np.pi * low_freq * bit_samples) * amplitude
+    high_30ms = np.cos(2.0 * np.pi * high_freq * bit_samples) * amplitude
+
+    sync_N = int(sync_duration / 1000 * sampling_rate)
+    sync_samples = np.arange(0, sync_N * period, period).astype(np.float32)
+    sync_wave = np.cos(2 * np.pi * sync_freq * sync_samples) * amplitude
+
+    for table in (low_30ms, high_30ms, sync_wave):
+        table.flags.writeable = False
+
+    return low_30ms, high_30ms, sync_wave
+
 
 '''
 Returns a band-pass filter around the frequency with a band of twice the interval
@@ -50,3 +78,17 @@ def coded_integer(value, bit_values):
             code[k] = True
 
     return code
+
+
+'''
+Vectorized version of coded_integer: returns a (N, bits) bool numpy array with the code of each value
+'''
+def coded_integers(values, bit_values):
+    buffer = np.array(values, dtype=np.int64)
+    code = np.zeros((buffer.size, bit_values.size), dtype=bool)
+
+    for k in range(bit_values.size):
+        code[:, k] = buffer >= bit_values[k]
+        buffer -= np.where(code[:, k], bit_values[k], 0)
+
+    return code
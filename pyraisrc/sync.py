@@ -0,0 +1,162 @@
+import functools
+from scipy.ndimage import maximum_filter1d
+from scipy.signal import oaconvolve
+from pyraisrc.signal_utils import *
+import numpy as np
+
+# Normalized correlation below which an alignment is not considered a signal
+minimum_score = 0.2
+
+# Share of the best score of the next signal length that an alignment must reach to be a start of signal
+relative_peak_floor = 0.8
+
+
+'''
+Returns the matched filter template of the start of an SRC signal as a float numpy array:
+the ID of the first frame (0 then 1) at sample 0 and the ID of the second frame (1 then 0) one second later.
+With sync_beeps the five 1 kHz beeps and the final one are added, covering the whole 8.1 s signal.
+Templates are built once per sampling rate and shared, so they are read-only
+'''
+@functools.lru_cache(maxsize=None)
+def sync_template(sampling_freq, sync_beeps=False):
+    # 30 ms long cos waves, as generated by the modulator
+    low_30ms, high_30ms, sync_wave = tone_templates(sampling_freq)
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+
+    frame_2_start = int(1.0 * sampling_freq)
+
+    if sync_beeps:
+        N = int(total_signal_duration / 1000 * sampling_freq)
+    else:
+        N = frame_2_start + 2 * bit_N
+
+    template = np.zeros(N, dtype=np.float64)
+    template[0:2 * bit_N] = np.concatenate([low_30ms, high_30ms])
+    template[frame_2_start:frame_2_start + 2 * bit_N] = np.concatenate([high_30ms, low_30ms])
+
+    if sync_beeps:
+        sync_N = int(sync_duration / 1000 * sampling_freq)
+
+        # the beeps start two seconds after the start of signal
+        for i in range(5):
+            t = (2 + i) * sampling_freq
+            template[t:t + sync_N] = sync_wave
+
+        template[-sync_N:] = sync_wave
+
+    template.flags.writeable = False
+    return template
+
+
+'''
+Returns the normalized cross-correlation (between -1 and +1) of data and template for every alignment,
+computed with a single overlap-add FFT correlation. Only the samples under the non-zero parts of the template
+(frame IDs, beeps) are used for normalization, so program audio in the gaps does not lower the score:
+the local energy under each part comes from a cumulative sum of the squared signal.
+Multi-channel data (N, C) is correlated along the first axis, all channels at once, and gives (alignments, C) scores
+'''
+def matched_filter(data, template):
+    data = np.asarray(data, dtype=np.float64)
+    M = data.shape[0] - template.size + 1
+    if M <= 0:
+        return np.zeros((0,) + data.shape[1:])
+
+    kernel = template[::-1].reshape((-1,) + (1,) * (data.ndim - 1))
+    products = oaconvolve(data, kernel, mode='valid', axes=0)
+
+    cumulative_energy = np.concatenate([np.zeros((1,) + data.shape[1:]), np.cumsum(data * data, axis=0)])
+    energies = np.zeros((M,) + data.shape[1:])
+    for start, values in _template_parts(template):
+        L = values.size
+        energies += cumulative_energy[start + L:start + L + M] - cumulative_energy[start:start + M]
+
+    norm = np.sqrt(np.maximum(energies, 0.0) * np.sum(template * template))
+
+    scores = np.zeros((M,) + data.shape[1:])
+    np.divide(products, norm, out=scores, where=norm > 1e-12)
+    return scores
+
+
+'''
+Returns the contiguous non-zero parts of a template as a list of (first sample, values)
+'''
+def _template_parts(template):
+    support = np.concatenate([[False], template != 0, [False]])
+    edges = np.flatnonzero(support[1:] != support[:-1])
+    return [(begin, template[begin:end]) for begin, end in zip(edges[0::2], edges[1::2])]
+
+
+'''
+Returns the sample offsets and scores of the first top_k starts of signal (in order of time), at least min_distance
+samples apart (one whole signal by default). Without the sync beeps, the template also matches later alignments
+where other bits of both frames read like the frame IDs, with the same score: the start of signal is the best
+alignment within one bit of the earliest alignment scoring at least score_floor and relative_peak_floor times
+the best score of the following min_distance samples, so that neither these aliases nor weaker noise peaks
+before the signal are taken for it. With top_k set to None every start of signal is returned
+'''
+def find_signal_starts(data, sampling_freq, top_k=1, sync_beeps=False, score_floor=minimum_score, min_distance=None):
+    scores = matched_filter(data, sync_template(sampling_freq, sync_beeps))
+    offsets = signal_starts_in_scores(scores, sampling_freq, top_k, score_floor, min_distance)
+    return offsets, scores[offsets]
+
+
+'''
+Returns the sample offset and score of the first start of signal (see find_signal_starts),
+offset is -1 if none was found
+'''
+def find_signal_start(data, sampling_freq, sync_beeps=False, score_floor=minimum_score):
+    offsets, scores = find_signal_starts(data, sampling_freq, 1, sync_beeps, score_floor)
+    if offsets.size == 0:
+        return -1, 0.0
+
+    return int(offsets[0]), float(scores[0])
+
+
+'''
+Returns the sample offsets and scores of the first start of signal (see find_signal_starts) in each channel
+of multi-channel data (N, C), as two (C,) arrays, the offset is -1 for channels without an alignment
+above score_floor
+'''
+def find_channel_starts(data, sampling_freq, sync_beeps=False, score_floor=minimum_score):
+    scores = matched_filter(data, sync_template(sampling_freq, sync_beeps))
+    channels = scores.shape[1]
+    offsets = np.full(channels, -1, dtype=np.int64)
+    best = np.zeros(channels)
+
+    for channel in range(channels):
+        peaks = signal_starts_in_scores(scores[:, channel], sampling_freq, 1, score_floor)
+        if peaks.size > 0:
+            offsets[channel] = peaks[0]
+            best[channel] = scores[peaks[0], channel]
+
+    return offsets, best
+
+
+'''
+Returns the offsets of the first top_k starts of signal (None for all) in a (M,) array of matched filter scores,
+see find_signal_starts. Scores of overlapping regions can be computed once and searched piece by piece
+'''
+def signal_starts_in_scores(scores, sampling_freq, top_k=1, score_floor=minimum_score, min_distance=None):
+    if min_distance is None:
+        min_distance = int(total_signal_duration / 1000 * sampling_freq)
+    min_distance = max(min_distance, 1)
+
+    if scores.size == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    bit_N = int(bit_duration / 1000 * sampling_freq)
+
+    # Best score of the alignments starting at each one and covering the next min_distance samples
+    following_best = maximum_filter1d(scores, min_distance, origin=-(min_distance // 2), mode='constant',
+                                      cval=-np.inf)
+    hits = np.flatnonzero((scores >= score_floor) & (scores >= relative_peak_floor * following_best))
+
+    offsets = []
+    position = 0
+    while position < hits.size and (top_k is None or len(offsets) < top_k):
+        hit = int(hits[position])
+        peak = hit + int(np.argmax(scores[hit:hit + bit_N]))
+        offsets.append(peak)
+        position = int(np.searchsorted(hits, peak + min_distance))
+
+    return np.array(offsets, dtype=np.int64)